@@ -1,25 +1,44 @@
 import os
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory
+from datetime import date, datetime, timedelta
+from flask import Flask, abort, g, has_app_context, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from flask_bcrypt import Bcrypt
 import jwt
 from dotenv import load_dotenv
 from flask_cors import CORS
 from functools import wraps
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import re
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import uuid
-from flask_socketio import SocketIO, emit, join_room
+from eventlet import patcher as eventlet_patcher, tpool
+from PIL import Image, ImageOps
+from flask_socketio import SocketIO, ConnectionRefusedError, emit, join_room, leave_room
+from sqlalchemy import Select, case, delete, event, exists, func, insert, literal, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+import click
+from sqlalchemy.orm import selectinload
+from werkzeug.security import safe_join
+from config import Config
 
 # Muat variabel lingkungan dari .env
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config.from_object(Config)
 
 FLASK_RUN_HOST = os.getenv('FLASK_RUN_HOST', '192.168.11.246')
 FLASK_RUN_PORT = os.getenv('FLASK_RUN_PORT', '5001')
@@ -27,16 +46,309 @@ FLASK_RUN_PORT = os.getenv('FLASK_RUN_PORT', '5001')
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
-db = SQLAlchemy(app)
+class RoutingSession(FlaskSQLAlchemySession):
+    """
+    Session yang mengarahkan SELECT dari route bertanda @read_replica ke bind 'replica'.
+    Flush, INSERT/UPDATE/DELETE dan route lain tetap memakai primary (read-your-writes).
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_app_context() and g.get('use_replica')):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 bcrypt = Bcrypt(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+def create_socketio_client_manager(url, channel):
+    """
+    Membuat client manager Socket.IO untuk URL filesystem:// (antrean berbasis folder lokal,
+    dipakai bersama oleh beberapa proses di satu host). URL lain diserahkan ke Flask-SocketIO.
+    """
+    if not url or not url.startswith('filesystem://'):
+        return None
+    from socketio import KombuManager
+    folder = url[len('filesystem://'):] or 'socketio-queue'
+    data_folder = os.path.join(folder, 'data')
+    control_folder = os.path.join(folder, 'control')
+    for path in (data_folder, control_folder):
+        os.makedirs(path, exist_ok=True)
+    return KombuManager('filesystem://', channel=channel, connection_options={
+        'transport_options': {
+            'data_folder_in': data_folder,
+            'data_folder_out': data_folder,
+            'control_folder': control_folder,
+            'polling_interval': 0.05
+        }
+    })
+
+socketio_options = {'cors_allowed_origins': "*"}
+client_manager = create_socketio_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL'])
+if client_manager:
+    socketio_options['client_manager'] = client_manager
+elif app.config['SOCKETIO_MESSAGE_QUEUE']:
+    socketio_options['message_queue'] = app.config['SOCKETIO_MESSAGE_QUEUE']
+    socketio_options['channel'] = app.config['SOCKETIO_CHANNEL']
+socketio = SocketIO(app, **socketio_options)
+
+# Pengguna per koneksi socket di proses ini: {sid: {'user_id': ...}}
+socket_sessions = {}
+
+def parse_bearer_token(header):
+    """
+    Mengambil token dari header 'Authorization: Bearer <token>'; None bila formatnya salah.
+    """
+    parts = (header or '').split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None
+    return parts[1]
+
+def owned_warung_ids(user_id):
+    """
+    Id warung milik pengguna, dari owned_warung_cache (diinvalidasi saat warung dibuat/dihapus).
+    """
+    warung_ids = owned_warung_cache.get(user_id)
+    if warung_ids is None:
+        warung_ids = frozenset(row.id for row in db.session.query(Warung.id).filter_by(pemilik_id=user_id))
+        owned_warung_cache.set(user_id, warung_ids)
+    return warung_ids
+
+@socketio.on('connect')
+def on_connect(auth):
+    """
+    Memvalidasi JWT yang sama dengan token_required sekali per koneksi, lalu memanaskan
+    cache warung milik pengguna agar join berikutnya tidak perlu query. Koneksi tanpa token
+    tetap diterima, tetapi hanya bisa memakai room katalog publik.
+    """
+    token = (auth or {}).get('token') or request.args.get('token')
+    if not token and 'Authorization' in request.headers:
+        token = parse_bearer_token(request.headers['Authorization'])
+        if not token:
+            raise ConnectionRefusedError('Token is invalid!')
+    if not token:
+        return
+
+    try:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    except jwt.PyJWTError:
+        raise ConnectionRefusedError('Token is invalid!')
+    if 'user_id' not in data:
+        raise ConnectionRefusedError('Token is invalid!')
+
+    user_id = data['user_id']
+    owned_warung_ids(user_id)
+    socket_sessions[request.sid] = {'user_id': user_id}
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    socket_sessions.pop(request.sid, None)
+
 @socketio.on('join')
 def on_join(data):
+    """
+    Bergabung ke room alert pesanan warung_{id}; hanya untuk pemilik warung tersebut.
+    """
     warung_id = data.get('warung_id')
     if warung_id:
+        socket_session = socket_sessions.get(request.sid)
+        if socket_session is None:
+            emit('join_error', {'warung_id': warung_id, 'message': 'Token is missing!'})
+            return
+        try:
+            warung_id = int(warung_id)
+        except (TypeError, ValueError):
+            emit('join_error', {'warung_id': warung_id, 'message': 'Warung ID tidak valid'})
+            return
+        # Kepemilikan dicek ulang setiap join (dari cache) sehingga warung yang dihapus
+        # setelah koneksi dibuka tidak bisa di-join lagi
+        if warung_id not in owned_warung_ids(socket_session['user_id']):
+            # Warung bisa saja dibuat setelah cache diisi
+            if not Warung.query.filter_by(id=warung_id, pemilik_id=socket_session['user_id']).first():
+                emit('join_error', {'warung_id': warung_id, 'message': 'Unauthorized'})
+                return
+            owned_warung_cache.invalidate(socket_session['user_id'])
+
+        last_event_id = data.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except (TypeError, ValueError):
+                emit('join_error', {'warung_id': warung_id, 'message': 'last_event_id tidak valid'})
+                return
+
         join_room(f'warung_{warung_id}')
         emit('joined_room', {'room': f'warung_{warung_id}'})
 
+        # Kirim ulang event yang terlewat selama klien terputus
+        if last_event_id is not None:
+            limit = app.config['ORDER_EVENT_REPLAY_LIMIT']
+            events = OrderEvent.query.filter(
+                OrderEvent.warung_id == warung_id,
+                OrderEvent.event_id > last_event_id
+            ).order_by(OrderEvent.event_id).limit(limit + 1).all()
+            emit('order_events_replay', {
+                'warung_id': warung_id,
+                'events': [json.loads(event.payload) for event in events[:limit]],
+                # False berarti masih ada event lain; klien sebaiknya join ulang dengan event_id terakhir
+                'lengkap': len(events) <= limit
+            })
+
+@socketio.on('join_katalog')
+def on_join_katalog(data):
+    """
+    Room publik per warung untuk menerima event katalog_delta (perubahan stok/harga produk).
+    """
+    warung_id = data.get('warung_id')
+    if warung_id:
+        join_room(f'katalog_{warung_id}')
+        emit('joined_room', {'room': f'katalog_{warung_id}'})
+
+@socketio.on('leave_katalog')
+def on_leave_katalog(data):
+    warung_id = data.get('warung_id')
+    if warung_id:
+        leave_room(f'katalog_{warung_id}')
+
+# --- Dispatcher Alert Pesanan ---
+class OrderAlertDispatcher:
+    """
+    Mengirim new_order_alert dari background task sehingga checkout langsung merespons setelah commit.
+    Alert yang masuk dalam satu jendela waktu dikelompokkan per room: room dengan satu alert
+    menerima new_order_alert seperti biasa, room dengan beberapa alert menerima satu
+    event new_order_alerts berisi daftar alert.
+    """
+    def __init__(self, socketio, window=0.05, max_batch=200, use_background=True):
+        self.socketio = socketio
+        self.window = window
+        self.max_batch = max_batch
+        self.use_background = use_background
+        self.latencies = deque(maxlen=2000)
+        self.sent = 0
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Dimulai saat dipakai pertama kali agar berjalan di proses worker, bukan proses induk
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    queue = self.socketio.server.eio.create_queue()
+                    self.socketio.start_background_task(self._run, queue)
+                    self._queue = queue
+
+    def enqueue(self, room, alert):
+        item = (time.monotonic(), room, alert)
+        if not self.use_background:
+            self._send([item])
+            return
+        self._ensure_started()
+        self._queue.put(item)
+
+    def _run(self, queue):
+        empty = self.socketio.server.eio.get_queue_empty_exception()
+        while True:
+            batch = [queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(queue.get(timeout=timeout))
+                except empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception as e:
+                print(f"Order alert dispatch error: {e}")
+
+    def _send(self, batch):
+        alerts_by_room = {}
+        for _, room, alert in batch:
+            alerts_by_room.setdefault(room, []).append(alert)
+        for room, alerts in alerts_by_room.items():
+            if len(alerts) == 1:
+                self.socketio.emit('new_order_alert', alerts[0], room=room)
+            else:
+                self.socketio.emit('new_order_alerts', {'alerts': alerts}, room=room)
+
+        now = time.monotonic()
+        with self._lock:
+            self.latencies.extend(now - enqueued_at for enqueued_at, _, _ in batch)
+            self.sent += len(batch)
+
+    def metrics(self):
+        with self._lock:
+            samples = sorted(self.latencies)
+            sent = self.sent
+
+        def percentile(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+
+        return {
+            'terkirim': sent,
+            'antrean': self._queue.qsize() if self._queue is not None else 0,
+            'latency_p50_ms': percentile(0.50),
+            'latency_p99_ms': percentile(0.99)
+        }
+
+# --- Dispatcher Delta Katalog ---
+class CatalogDeltaDispatcher:
+    """
+    Mengirim perubahan produk (produk_id, stok, harga) ke room katalog_{warung_id}.
+    Perubahan produk yang sama dalam satu jendela digabung sehingga hanya nilai terakhir terkirim.
+    """
+    def __init__(self, socketio, window=0.5):
+        self.socketio = socketio
+        self.window = window
+        self._pending = {}
+        self._started = False
+        self._lock = threading.Lock()
+
+    def publish(self, warung_id, deltas):
+        if not deltas:
+            return
+        if self.window <= 0:
+            self._send({(warung_id, delta['produk_id']): delta for delta in deltas})
+            return
+        with self._lock:
+            for delta in deltas:
+                self._pending[(warung_id, delta['produk_id'])] = delta
+            if not self._started:
+                self.socketio.start_background_task(self._run)
+                self._started = True
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.window)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                self._send(pending)
+            except Exception as e:
+                print(f"Catalog delta dispatch error: {e}")
+
+    def _send(self, pending):
+        deltas_by_warung = {}
+        for (warung_id, _), delta in pending.items():
+            deltas_by_warung.setdefault(warung_id, []).append(delta)
+        for warung_id, deltas in deltas_by_warung.items():
+            self.socketio.emit('katalog_delta', {
+                'warung_id': warung_id,
+                'produk': deltas
+            }, room=f'katalog_{warung_id}')
+
+catalog_deltas = CatalogDeltaDispatcher(socketio, window=app.config['CATALOG_DELTA_WINDOW'])
+
+order_alerts = OrderAlertDispatcher(
+    socketio,
+    window=app.config['ORDER_ALERT_BATCH_WINDOW'],
+    max_batch=app.config['ORDER_ALERT_BATCH_SIZE'],
+    use_background=app.config['ORDER_ALERT_ASYNC']
+)
+
 
 # --- Model Pengguna ---
 class User(db.Model):
@@ -81,7 +393,7 @@ class Produk(db.Model):
 # --- Model Keranjang (Shopping Cart) ---
 class Keranjang(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True) # Indeks di foreign key
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Diindeks oleh uq_keranjang_user_produk
     produk_id = db.Column(db.Integer, db.ForeignKey('produk.id'), nullable=False, index=True) # Indeks di foreign key
     jumlah = db.Column(db.Integer, nullable=False, default=1)
     
@@ -89,11 +401,14 @@ class Keranjang(db.Model):
     user = db.relationship('User', backref='keranjang_items')
     produk = db.relationship('Produk')
 
+    # Satu baris per (user, produk); target ON CONFLICT untuk upsert keranjang. Lihat MIGRATIONS.
+    __table_args__ = (db.Index('uq_keranjang_user_produk', 'user_id', 'produk_id', unique=True),)
+
 # --- Model Pesanan ---
 class Pesanan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True) # Indeks di foreign key
-    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), nullable=False, index=True) # Indeks di foreign key
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Diindeks oleh ix_pesanan_user_tanggal
+    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), nullable=False) # Diindeks oleh ix_pesanan_warung_tanggal
     tanggal = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Menunggu Pembayaran', index=True)
     alamat_pengiriman = db.Column(db.String(255))
@@ -103,6 +418,13 @@ class Pesanan(db.Model):
     user = db.relationship('User', backref='pesanan_dibuat')
     warung = db.relationship('Warung', backref='pesanan_masuk')
     detail_pesanan = db.relationship('DetailPesanan', backref='pesanan', lazy=True)
+
+    # Indeks komposit untuk query panas (lihat MIGRATIONS dan tests/test_query_plans.py):
+    # pesanan per warung/pembeli urut tanggal, id sebagai pemutus seri keyset.
+    __table_args__ = (
+        db.Index('ix_pesanan_warung_tanggal', 'warung_id', 'tanggal', 'id'),
+        db.Index('ix_pesanan_user_tanggal', 'user_id', 'tanggal', 'id'),
+    )
     
 # --- Model Detail Pesanan ---
 class DetailPesanan(db.Model):
@@ -115,9 +437,321 @@ class DetailPesanan(db.Model):
     # Hapus index=True dari sini
     produk = db.relationship('Produk')
 
-# Buat database jika belum ada
+# --- Model Rekap Penjualan Harian ---
+# Diperbarui dalam transaksi yang sama dengan pembuatan/perubahan status pesanan,
+# sehingga dashboard dan wallet cukup membaca O(hari) baris. Lihat `flask rebuild-rollup`.
+class RekapHarianWarung(db.Model):
+    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), primary_key=True)
+    tanggal = db.Column(db.Date, primary_key=True)
+    jumlah_pesanan = db.Column(db.Integer, nullable=False, default=0)
+    pendapatan = db.Column(db.Float, nullable=False, default=0.0)
+    jumlah_selesai = db.Column(db.Integer, nullable=False, default=0)
+    pendapatan_selesai = db.Column(db.Float, nullable=False, default=0.0)
+
+class RekapHarianProduk(db.Model):
+    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), primary_key=True)
+    tanggal = db.Column(db.Date, primary_key=True)
+    produk_id = db.Column(db.Integer, db.ForeignKey('produk.id'), primary_key=True)
+    total_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    total_pendapatan = db.Column(db.Float, nullable=False, default=0.0)
+
+# --- Model Outbox Event Pesanan ---
+# Ditulis dalam commit yang sama dengan Pesanan; event_id naik monoton per warung
+# sehingga klien bisa meminta replay event setelah last_event_id saat join ulang.
+class WarungEventSeq(db.Model):
+    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+
+class OrderEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    warung_id = db.Column(db.Integer, db.ForeignKey('warung.id'), nullable=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    jenis = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.UniqueConstraint('warung_id', 'event_id'),)
+
+# --- Model Penyimpanan Upload ---
+# File upload disimpan berdasarkan sha256 isinya di uploads/ab/cd/<hash><ext>; byte yang sama
+# hanya disimpan sekali. UploadRef mencatat user/produk yang memakai blob agar blob yatim bisa
+# dihapus oleh `flask gc-uploads`.
+class UploadBlob(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(200), nullable=False)
+    ukuran = db.Column(db.Integer, nullable=False)
+    # Diperbarui setiap kali byte yang sama di-upload ulang; dasar masa tenggang GC
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class UploadRef(db.Model):
+    jenis = db.Column(db.String(20), primary_key=True) # 'avatar' (User.id) atau 'produk' (Produk.id)
+    pemilik_id = db.Column(db.Integer, primary_key=True)
+    blob_hash = db.Column(db.String(64), db.ForeignKey('upload_blob.hash'), nullable=False, index=True)
+
+# --- Model Refresh Token ---
+# Hanya sha256 token yang disimpan. Setiap refresh merotasi token dalam satu family;
+# token lama yang dipakai ulang dianggap bocor dan seluruh family dicabut.
+class RefreshToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    family_id = db.Column(db.String(36), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Pragma per koneksi SQLite: WAL membuat pembaca tidak menunggu penulis (checkout),
+    synchronous=NORMAL cukup aman di mode WAL, busy_timeout menunggu kunci alih-alih gagal.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}")
+    cursor.close()
+
 with app.app_context():
-    db.create_all()
+    for engine in db.engines.values():
+        if engine.dialect.name == 'sqlite' and app.config['SQLITE_TUNING']:
+            event.listen(engine, 'connect', set_sqlite_pragmas)
+
+# --- Migrasi Skema ---
+# create_all() hanya membuat tabel baru; perubahan pada tabel yang sudah ada
+# (indeks, constraint) dijalankan sebagai migrasi bernomor dan dicatat di schema_migration.
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migration'
+    versi = db.Column(db.Integer, primary_key=True)
+    nama = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+def create_model_indexes(connection, *names):
+    """
+    Membuat indeks yang dideklarasikan di model (by nama) jika belum ada.
+    """
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+def migrate_hot_query_indexes(connection):
+    """
+    Menggabungkan baris keranjang ganda (user, produk) lalu membuat indeks komposit query panas
+    dan unique index keranjang.
+    """
+    duplicates = connection.execute(
+        db.select(Keranjang.user_id, Keranjang.produk_id, func.min(Keranjang.id), func.sum(Keranjang.jumlah))
+        .group_by(Keranjang.user_id, Keranjang.produk_id)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, produk_id, keep_id, total_jumlah in duplicates:
+        connection.execute(update(Keranjang).where(Keranjang.id == keep_id).values(jumlah=total_jumlah))
+        connection.execute(delete(Keranjang).where(
+            Keranjang.user_id == user_id, Keranjang.produk_id == produk_id, Keranjang.id != keep_id
+        ))
+
+    # Versi awal migrasi ini juga membuat ix_pesanan_warung_status_total; dibuang di migrasi 3
+    create_model_indexes(
+        connection,
+        'uq_keranjang_user_produk',
+        'ix_pesanan_warung_tanggal',
+        'ix_pesanan_user_tanggal',
+    )
+
+def migrate_backfill_sales_rollup(connection):
+    """
+    Mengisi tabel rekap harian dari pesanan yang dibuat sebelum rekap diperbarui saat checkout.
+    """
+    rebuild_sales_rollup(connection)
+
+def migrate_drop_pesanan_status_index(connection):
+    """
+    Wallet membaca rekap harian, bukan Pesanan per (warung, status); indeks itu hanya menambah
+    biaya tulis checkout dan perubahan status.
+    """
+    connection.execute(text('DROP INDEX IF EXISTS ix_pesanan_warung_status_total'))
+
+def migrate_drop_prefix_indexes(connection):
+    """
+    Indeks satu kolom yang merupakan awalan indeks komposit dari migrasi 1 tidak menambah
+    kemampuan query, hanya biaya tulis checkout dan keranjang.
+    """
+    for name in ('ix_keranjang_user_id', 'ix_pesanan_warung_id', 'ix_pesanan_user_id'):
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+# Urutan tetap; jangan mengubah/menghapus entri yang sudah dirilis, tambahkan versi baru di akhir.
+MIGRATIONS = [
+    (1, 'indeks komposit query panas + unique keranjang', migrate_hot_query_indexes),
+    (2, 'isi rekap penjualan harian dari pesanan lama', migrate_backfill_sales_rollup),
+    (3, 'hapus indeks pesanan (warung, status) yang tidak dipakai', migrate_drop_pesanan_status_index),
+    (4, 'hapus indeks satu kolom yang tercakup indeks komposit', migrate_drop_prefix_indexes),
+]
+
+def run_migrations():
+    """
+    Menjalankan migrasi yang belum tercatat, masing-masing dalam transaksinya sendiri.
+    Mengembalikan daftar (versi, nama) yang baru dijalankan.
+    """
+    applied = {versi for (versi,) in db.session.query(SchemaMigration.versi)}
+    db.session.rollback()
+    done = []
+    for versi, nama, migrate in MIGRATIONS:
+        if versi in applied:
+            continue
+        with db.engine.begin() as connection:
+            migrate(connection)
+            connection.execute(insert(SchemaMigration).values(versi=versi, nama=nama, applied_at=datetime.utcnow()))
+        done.append((versi, nama))
+    return done
+
+def init_db():
+    """
+    Membuat tabel yang belum ada lalu menjalankan migrasi yang tertunda.
+    """
+    with app.app_context():
+        db.create_all()
+        return run_migrations()
+
+# --- Cache Pengguna (per proses) ---
+class TTLCache:
+    """
+    Cache LRU sederhana dengan masa berlaku (TTL) per entri, aman dipakai lintas thread.
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+# Kolom profil yang boleh disimpan di cache (password_hash sengaja tidak ikut)
+USER_CACHE_FIELDS = ('id', 'username', 'email', 'bio', 'avatar_url', 'nama_lengkap')
+
+user_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+# Daftar id warung milik pengguna, dipakai otorisasi join Socket.IO saat badai reconnect
+owned_warung_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+class UserNotFound(Exception):
+    pass
+
+class CurrentUser:
+    """
+    Proxy pengguna yang sedang login untuk mode token stateless.
+    id dari token dan kolom profil di user_cache dibaca tanpa query; baris User lengkap
+    baru dimuat saat handler membaca field lain, relasi, atau mengubah data.
+    Klaim lain di token (mis. username) tidak dipakai karena bisa basi sampai token kedaluwarsa.
+    """
+    def __init__(self, claims):
+        object.__setattr__(self, '_claims', claims)
+        object.__setattr__(self, '_row', None)
+
+    def _load(self):
+        if self._row is None:
+            row = db.session.get(User, self._claims['id'])
+            if row is None:
+                raise UserNotFound()
+            object.__setattr__(self, '_row', row)
+            user_cache.set(row.id, {field: getattr(row, field) for field in USER_CACHE_FIELDS})
+        return self._row
+
+    def __getattr__(self, name):
+        if self._row is None:
+            if name == 'id':
+                return self._claims['id']
+            if name in USER_CACHE_FIELDS:
+                cached = user_cache.get(self._claims['id'])
+                if cached is not None:
+                    return cached[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+@app.errorhandler(UserNotFound)
+def handle_user_not_found(e):
+    return jsonify({'message': 'Token is invalid!'}), 401
+
+# --- Hash Password ---
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """
+    Menjalankan bcrypt di thread OS sungguhan agar hub eventlet (dan semua koneksi Socket.IO)
+    tidak terblokir selama hash: eventlet.tpool bila thread di-monkey-patch, ThreadPoolExecutor selain itu.
+    Jumlah hash yang berjalan/menunggu dibatasi max_pending; selebihnya PasswordHasherBusy (503).
+    Thread hash diberi prioritas OS lebih rendah (nice) agar tidak merebut CPU dari hub.
+    """
+    def __init__(self, workers, max_pending, nice=0):
+        self.max_pending = max_pending
+        self.nice = nice
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # Ukuran pool thread OS eventlet (dipakai bersama resize gambar); hanya berlaku sebelum tpool dipakai
+        tpool.set_num_threads(workers)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy()
+            self._pending += 1
+        try:
+            if eventlet_patcher.is_monkey_patched('thread'):
+                return tpool.execute(self._call_niced, fn, *args)
+            return self._executor.submit(self._call_niced, fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _call_niced(self, fn, *args):
+        # Berjalan di thread OS pool; di Linux setpriority(PRIO_PROCESS, 0) hanya mengenai thread ini
+        if self.nice and hasattr(os, 'setpriority'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            except OSError:
+                pass
+        return fn(*args)
+
+    def hash(self, password):
+        return self._run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'], app.config['PASSWORD_HASH_NICE']
+)
+
+@app.errorhandler(PasswordHasherBusy)
+def handle_password_hasher_busy(e):
+    response = jsonify({'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 # --- Middleware Otentikasi ---
 def token_required(f):
@@ -125,14 +759,18 @@ def token_required(f):
     def decorator(*args, **kwargs):
         token = None
         if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
+            token = parse_bearer_token(request.headers['Authorization'])
 
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['user_id']).first()
+            if app.config['AUTH_STATELESS']:
+                # Baris User dimuat lazily oleh CurrentUser (atau dibaca dari user_cache)
+                current_user = CurrentUser({'id': data['user_id']})
+            else:
+                current_user = User.query.filter_by(id=data['user_id']).first()
             if not current_user:
                 return jsonify({'message': 'Token is invalid!'}), 401
         except Exception as e:
@@ -142,6 +780,192 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorator
 
+def read_replica(f):
+    """
+    Menandai route publik read-only: query SELECT-nya dilayani replica bila
+    REPLICA_DATABASE_URL dikonfigurasi, selain itu tetap ke primary.
+    """
+    @wraps(f)
+    def decorator(*args, **kwargs):
+        g.use_replica = 'replica' in app.config['SQLALCHEMY_BINDS']
+        return f(*args, **kwargs)
+    return decorator
+
+# --- Helper Paginasi ---
+def get_page_size():
+    """
+    Membaca ukuran halaman dari query string ?limit=, dibatasi MAX_PAGE_SIZE.
+    """
+    limit = request.args.get('limit', type=int) or app.config['DEFAULT_PAGE_SIZE']
+    return max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+
+def get_date_range():
+    """
+    Membaca filter ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD (keduanya inklusif).
+    Mengembalikan (awal, akhir_eksklusif) berupa datetime atau None; ValueError bila format salah.
+    """
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
+    return start, end
+
+def encode_pesanan_cursor(pesanan):
+    return f"{pesanan.tanggal.isoformat()}_{pesanan.id}"
+
+def decode_pesanan_cursor(cursor):
+    """
+    Mengurai cursor keyset (tanggal, id) hasil encode_pesanan_cursor; ValueError bila tidak valid.
+    """
+    tanggal, pesanan_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(tanggal), int(pesanan_id)
+
+# --- Helper Streaming ---
+def wants_stream():
+    """
+    Klien meminta respons streaming lewat ?stream=1 atau header Accept: application/x-ndjson.
+    """
+    return request.args.get('stream') == '1' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+def ndjson_response(rows):
+    """
+    Mengalirkan iterable berisi dict sebagai NDJSON (satu objek JSON per baris)
+    tanpa menampung seluruh hasil di memori.
+    """
+    def generate():
+        for row in rows:
+            yield app.json.dumps(row) + '\n'
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# --- Cache Respons Katalog ---
+class LocalCacheBackend(TTLCache):
+    """
+    Backend cache respons di memori proses (LRU + TTL).
+    Nomor generasi namespace disimpan terpisah agar tidak ikut tergusur LRU.
+    """
+    def __init__(self, maxsize=2048, ttl=600):
+        super().__init__(maxsize, ttl)
+        self._generations = {}
+        self._bumped_at = {}
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._bumped_at[namespace] = time.time()
+
+    def bumped_at(self, namespace):
+        return self._bumped_at.get(namespace, 0)
+
+class RedisCacheBackend:
+    """
+    Backend cache respons bersama (Redis) untuk deployment multi-worker.
+    """
+    def __init__(self, url, ttl=600):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(f'resp:{key}')
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value):
+        self.client.set(f'resp:{key}', json.dumps(value), ex=self.ttl)
+
+    def invalidate(self, key):
+        self.client.delete(f'resp:{key}')
+
+    def generation(self, namespace):
+        return int(self.client.get(f'gen:{namespace}') or 0)
+
+    def bump(self, namespace):
+        self.client.incr(f'gen:{namespace}')
+        self.client.set(f'bumped:{namespace}', time.time())
+
+    def bumped_at(self, namespace):
+        return float(self.client.get(f'bumped:{namespace}') or 0)
+
+class ResponseCache:
+    """
+    Cache body JSON + ETag per namespace. Invalidasi menaikkan generasi namespace,
+    sehingga semua entri lama (mis. semua halaman daftar warung) langsung tidak terpakai.
+    Kunci diambil sekali lewat key() lalu dipakai untuk get dan set: respons yang dibangun
+    sebelum invalidasi tersimpan di generasi lama, bukan di generasi baru.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def key(self, namespace, part):
+        return f'{namespace}:{self.backend.generation(namespace)}:{part}'
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, entry):
+        self.backend.set(key, entry)
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+if app.config['RESPONSE_CACHE_URL']:
+    response_cache = ResponseCache(RedisCacheBackend(app.config['RESPONSE_CACHE_URL'], app.config['RESPONSE_CACHE_TTL']))
+else:
+    response_cache = ResponseCache(LocalCacheBackend(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL']))
+
+def cached_json_response(namespace, part, build):
+    """
+    Menyajikan respons JSON dari response_cache, membangunnya dengan build() bila belum ada.
+    build() mengembalikan (payload, status); hanya status 200 yang disimpan.
+    If-None-Match yang cocok dengan ETag dijawab 304 tanpa serialisasi ulang.
+    """
+    key = response_cache.key(namespace, part)
+    entry = response_cache.get(key)
+    if entry is None:
+        # Replica mungkin belum menerima perubahan yang baru saja membuang cache ini;
+        # bangun dari primary agar data lama tidak tersimpan ulang selama TTL
+        if g.get('use_replica') and time.time() - response_cache.backend.bumped_at(namespace) < app.config['REPLICA_MAX_LAG']:
+            g.use_replica = False
+        payload, status = build()
+        if status != 200:
+            return jsonify(payload), status
+        body = app.json.dumps(payload)
+        entry = {'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(), 'body': body}
+        response_cache.set(key, entry)
+
+    response = app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    return response.make_conditional(request)
+
+def invalidate_catalog(*warung_ids, warung_list=False):
+    """
+    Membuang cache katalog untuk warung tertentu, dan daftar semua warung bila warung_list=True.
+    Dipanggil setelah commit yang mengubah warung, produk, atau stok.
+    """
+    namespaces = [f'warung:{warung_id}' for warung_id in warung_ids]
+    if warung_list:
+        namespaces.append('warung_list')
+    response_cache.invalidate(*namespaces)
+
+def produk_delta(produk, dihapus=False):
+    delta = {'produk_id': produk.id, 'stok': produk.stok, 'harga': produk.harga}
+    if dihapus:
+        delta['dihapus'] = True
+    return delta
+
+def stock_deltas(produk_ids):
+    """
+    Membaca stok terbaru produk yang baru dikurangi (dalam transaksi berjalan),
+    dikelompokkan per warung untuk catalog_deltas.publish.
+    """
+    deltas = {}
+    for row in db.session.query(Produk.id, Produk.stok, Produk.harga, Produk.warung_id).filter(Produk.id.in_(produk_ids)):
+        deltas.setdefault(row.warung_id, []).append(produk_delta(row))
+    return deltas
+
 # --- Endpoint Registrasi & Login (seperti sebelumnya) ---
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -156,7 +980,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({'error': 'Email already exists'}), 400
     
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = password_hasher.hash(password)
     
     new_user = User(username=username, email=email, password_hash=hashed_password)
     db.session.add(new_user)
@@ -172,20 +996,262 @@ def login():
 
     user = User.query.filter_by(email=email).first()
 
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
+    if not user or not password_hasher.check(user.password_hash, password):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    token_payload = {
-        'user_id': user.id,
-        'exp': datetime.utcnow() + timedelta(minutes=30)
-    }
-    token = jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm="HS256")
+    token = create_access_token(user.id, user.username)
+    refresh_token = issue_refresh_token(user.id)
+    db.session.commit()
     
     return jsonify({
         'message': 'Login successful!',
-        'token': token
+        'token': token,
+        'refresh_token': refresh_token
     }), 200
 
+# --- Refresh Token ---
+def create_access_token(user_id, username):
+    token_payload = {
+        'user_id': user_id,
+        'username': username,
+        'exp': datetime.utcnow() + timedelta(minutes=app.config['ACCESS_TOKEN_MINUTES'])
+    }
+    return jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm="HS256")
+
+def hash_refresh_token(refresh_token):
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+def issue_refresh_token(user_id, family_id=None):
+    """
+    Membuat refresh token baru (family baru bila family_id kosong). Commit oleh pemanggil.
+    """
+    refresh_token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(refresh_token),
+        family_id=family_id or str(uuid.uuid4()),
+        expires_at=datetime.utcnow() + timedelta(days=app.config['REFRESH_TOKEN_DAYS'])
+    ))
+    return refresh_token
+
+def revoke_refresh_tokens(*criteria):
+    db.session.execute(
+        update(RefreshToken).where(RefreshToken.revoked_at.is_(None), *criteria).values(revoked_at=datetime.utcnow())
+    )
+
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_access_token():
+    """
+    Menukar refresh token dengan access token dan refresh token baru (rotasi) tanpa bcrypt.
+    Token yang sudah dirotasi/dicabut lalu dipakai lagi mencabut seluruh family-nya.
+    """
+    data = request.get_json() or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({'error': 'Missing refresh token'}), 400
+
+    row = db.session.query(RefreshToken, User.username).join(User, RefreshToken.user_id == User.id).filter(
+        RefreshToken.token_hash == hash_refresh_token(refresh_token)
+    ).first()
+    if not row or row.RefreshToken.expires_at < datetime.utcnow():
+        return jsonify({'error': 'Invalid or expired refresh token'}), 401
+    stored, username = row
+
+    # Tandai terpakai secara kondisional: dua refresh bersamaan dengan token yang sama tidak bisa keduanya lolos
+    result = db.session.execute(
+        update(RefreshToken).where(RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        revoke_refresh_tokens(RefreshToken.family_id == stored.family_id)
+        db.session.commit()
+        return jsonify({'error': 'Refresh token reuse detected; please log in again'}), 401
+
+    new_refresh_token = issue_refresh_token(stored.user_id, stored.family_id)
+    db.session.commit()
+
+    return jsonify({
+        'token': create_access_token(stored.user_id, username),
+        'refresh_token': new_refresh_token
+    }), 200
+
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """
+    Mencabut refresh token (beserta family rotasinya). Access token tetap berlaku sampai kedaluwarsa.
+    """
+    data = request.get_json() or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({'error': 'Missing refresh token'}), 400
+
+    family_id = db.session.query(RefreshToken.family_id).filter_by(
+        token_hash=hash_refresh_token(refresh_token)
+    ).scalar()
+    if family_id:
+        revoke_refresh_tokens(RefreshToken.family_id == family_id)
+        db.session.commit()
+
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+@app.route('/api/token/revoke-all', methods=['POST'])
+@token_required
+def revoke_all_refresh_tokens(current_user):
+    """
+    Mencabut semua refresh token milik pengguna (keluar dari semua perangkat).
+    """
+    revoke_refresh_tokens(RefreshToken.user_id == current_user.id)
+    db.session.commit()
+    return jsonify({'message': 'All sessions revoked'}), 200
+
+# --- Pipeline Gambar Upload ---
+# Tipe file ditentukan dari magic bytes, bukan ekstensi/Content-Type dari client.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+class InvalidImage(Exception):
+    pass
+
+def detect_image_extension(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def run_blocking(fn, *args):
+    """
+    Menjalankan pekerjaan CPU-bound. Di worker eventlet (thread di-monkey-patch) dijalankan
+    lewat eventlet.tpool di thread OS sungguhan agar hub tidak terblokir; selain itu dipanggil langsung.
+    """
+    if eventlet_patcher.is_monkey_patched('thread'):
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+def image_variant_filename(filename, variant):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_{variant}.{app.config['IMAGE_VARIANT_FORMAT'].lower()}"
+
+def generate_image_variants(filename):
+    """
+    Membuat varian kecil (resize + kompres ulang) dari gambar upload. Ditulis ke file sementara
+    lalu di-rename sehingga serve_uploads tidak pernah membaca varian setengah jadi.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    image_format = app.config['IMAGE_VARIANT_FORMAT']
+    with Image.open(os.path.join(folder, filename)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        if image_format == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        for variant, size in app.config['IMAGE_VARIANTS'].items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            variant_path = os.path.join(folder, image_variant_filename(filename, variant))
+            # Nama sementara unik: blob yang sama bisa diproses dua job sekaligus (upload ganda)
+            temp_path = f'{variant_path}.{uuid.uuid4()}.tmp'
+            resized.save(temp_path, image_format, quality=app.config['IMAGE_VARIANT_QUALITY'])
+            os.replace(temp_path, variant_path)
+
+def image_variant_job(filename):
+    try:
+        run_blocking(generate_image_variants, filename)
+    except Exception as e:
+        print(f"Image variant error for {filename}: {e}")
+
+image_executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='image-variant')
+
+def save_uploaded_image(file):
+    """
+    Menyalin file upload per chunk ke file sementara (tanpa memuat seluruh isi ke memori) sambil
+    menghitung sha256, memvalidasi magic bytes chunk pertama, lalu memindahkannya ke path berbasis hash.
+    Byte yang sudah pernah disimpan tidak ditulis ulang. Varian dibuat di background bila belum ada.
+    Mengembalikan path relatif file tersimpan; InvalidImage jika bukan gambar yang didukung.
+    """
+    head = file.stream.read(UPLOAD_CHUNK_SIZE)
+    extension = detect_image_extension(head)
+    if not extension:
+        raise InvalidImage('Unsupported image type')
+
+    folder = app.config['UPLOAD_FOLDER']
+    temp_path = os.path.join(folder, f'.{uuid.uuid4()}.tmp')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as output:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                size += len(chunk)
+                output.write(chunk)
+                chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+
+        content_hash = digest.hexdigest()
+        relative_path = blob_path(content_hash, extension)
+        filepath = os.path.join(folder, relative_path)
+        if os.path.exists(filepath):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            os.replace(temp_path, filepath)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    stmt = dialect_insert(UploadBlob).values(hash=content_hash, path=relative_path, ukuran=size, uploaded_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['hash'], set_={'uploaded_at': stmt.excluded.uploaded_at}))
+    db.session.commit()
+
+    if not all(os.path.exists(os.path.join(folder, image_variant_filename(relative_path, variant)))
+               for variant in app.config['IMAGE_VARIANTS']):
+        image_executor.submit(image_variant_job, relative_path)
+    return relative_path
+
+def blob_path(content_hash, extension):
+    # Dua level shard (256 x 256 direktori) menjaga jumlah entri per direktori tetap kecil
+    return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+def upload_url(filename):
+    return f"{request.scheme}://{request.host}/{app.config['UPLOAD_FOLDER']}/{filename}"
+
+BLOB_URL_PATTERN = re.compile(r'/uploads/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+
+def sync_upload_refs(jenis, urls):
+    """
+    Menyamakan UploadRef dengan URL gambar terbaru, urls = {pemilik_id: url atau None}.
+    URL yang bukan blob upload (atau None) menghapus ref. Dijalankan dalam transaksi pemanggil.
+    """
+    hashes = {}
+    for pemilik_id, url in urls.items():
+        match = BLOB_URL_PATTERN.search(url.split('?', 1)[0]) if url else None
+        hashes[pemilik_id] = match.group(1) if match else None
+
+    known = {content_hash for (content_hash,) in db.session.query(UploadBlob.hash).filter(
+        UploadBlob.hash.in_({h for h in hashes.values() if h})
+    )} if any(hashes.values()) else set()
+    rows = [{'jenis': jenis, 'pemilik_id': pemilik_id, 'blob_hash': content_hash}
+            for pemilik_id, content_hash in hashes.items() if content_hash in known]
+    cleared = [pemilik_id for pemilik_id, content_hash in hashes.items() if content_hash not in known]
+
+    if cleared:
+        db.session.execute(delete(UploadRef).where(UploadRef.jenis == jenis, UploadRef.pemilik_id.in_(cleared)))
+    if rows:
+        stmt = dialect_insert(UploadRef)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['jenis', 'pemilik_id'], set_={'blob_hash': stmt.excluded.blob_hash}
+        ), rows)
+
+def image_variant_urls(url):
+    return {variant: f'{url}?variant={variant}' for variant in app.config['IMAGE_VARIANTS']}
+
 @app.route('/api/upload_avatar', methods=['POST'])
 @token_required
 def upload_avatar(current_user):
@@ -196,31 +1262,71 @@ def upload_avatar(current_user):
     
     file = request.files['avatar']
     
-    # Hasilkan nama file unik
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = str(uuid.uuid4()) + file_extension
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    
-    # Simpan file ke sistem file server
+    # Simpan file ke sistem file server; varian thumb/medium dibuat di background
     try:
-        file.save(filepath)
+        unique_filename = save_uploaded_image(file)
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
         
     # Buat URL publik untuk gambar
     # Objek 'request' sekarang tersedia secara global karena impor di atas
-    avatar_url = f"{request.scheme}://{request.host}/{app.config['UPLOAD_FOLDER']}/{unique_filename}"
+    avatar_url = upload_url(unique_filename)
     
     # Optional: Update user's avatar_url in the database
     # current_user.avatar_url = avatar_url
     # db.session.commit()
     
-    return jsonify({'avatar_url': avatar_url}), 200
+    return jsonify({'avatar_url': avatar_url, 'variants': image_variant_urls(avatar_url)}), 200
 
-# Endpoint untuk menyajikan file statis dari folder 'uploads'
-@app.route('/uploads/<filename>')
+def send_upload(filename, immutable=True):
+    """
+    Mengirim file upload dengan ETag kuat dari nama file (hash isi/uuid, unik per isi) dan,
+    bila immutable, Cache-Control: public, max-age=UPLOADS_MAX_AGE, immutable.
+    If-None-Match dan Range ditangani send_file (304/206); byte dikirim lewat wsgi.file_wrapper
+    (sendfile di gunicorn) atau diserahkan ke proxy depan sesuai UPLOADS_OFFLOAD.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    etag = os.path.splitext(os.path.basename(filename))[0]
+    max_age = app.config['UPLOADS_MAX_AGE'] if immutable else None
+
+    if app.config['UPLOADS_OFFLOAD'] == 'x-accel-redirect':
+        filepath = safe_join(folder, filename)
+        if filepath is None or not os.path.isfile(filepath):
+            abort(404)
+        # nginx melayani byte (termasuk Range) dari location internal; aplikasi hanya mengisi header
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/')}/{filename}"
+        response.set_etag(etag)
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        response.make_conditional(request)
+    else:
+        response = send_from_directory(folder, filename, etag=etag, max_age=max_age)
+
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+# Endpoint untuk menyajikan file statis dari folder 'uploads' (termasuk path blob ab/cd/<hash>)
+# ?variant=thumb|medium menyajikan varian kecil; selama varian belum jadi, file asli dikirim
+# tanpa immutable (no-cache) agar client meminta ulang dan mendapat varian setelah siap.
+@app.route('/uploads/<path:filename>')
+@read_replica
 def serve_uploads(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    variant = request.args.get('variant')
+    if variant:
+        if variant not in app.config['IMAGE_VARIANTS']:
+            return jsonify({'error': 'Unknown variant'}), 400
+        variant_filename = image_variant_filename(filename, variant)
+        if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], variant_filename)):
+            return send_upload(variant_filename)
+        return send_upload(filename, immutable=False)
+    return send_upload(filename)
 
 
 # --- Endpoint Profil (seperti sebelumnya) ---
@@ -259,8 +1365,13 @@ def update_profile(current_user):
     # Perbarui avatar_url dari permintaan
     if 'avatar_url' in data:
         current_user.avatar_url = data['avatar_url']
+        sync_upload_refs('avatar', {current_user.id: data['avatar_url']})
     
     db.session.commit()
+    user_cache.invalidate(current_user.id)
+    if 'username' in data:
+        # Nama pemilik ikut tampil di katalog warung
+        invalidate_catalog(*[w.id for w in current_user.warung], warung_list=True)
 
     return jsonify({
         'message': 'User profile updated successfully!',
@@ -295,6 +1406,8 @@ def add_warung(current_user):
 
     db.session.add(new_warung)
     db.session.commit()
+    invalidate_catalog(new_warung.id, warung_list=True)
+    owned_warung_cache.invalidate(current_user.id)
     
     return jsonify({
         'message': 'Warung created successfully',
@@ -323,6 +1436,7 @@ def update_warung(current_user, warung_id):
     warung.deskripsi = data.get('deskripsi', warung.deskripsi)
     
     db.session.commit()
+    invalidate_catalog(warung_id, warung_list=True)
     
     return jsonify({
         'message': 'Warung updated successfully',
@@ -349,55 +1463,85 @@ def delete_warung(current_user, warung_id):
         return jsonify({'message': 'Unauthorized: You are not the owner of this warung'}), 403
 
     # Hapus semua produk terkait di warung ini
+    deltas = []
     for produk in warung.produk:
+        deltas.append(produk_delta(produk, dihapus=True))
         db.session.delete(produk)
+    sync_upload_refs('produk', {delta['produk_id']: None for delta in deltas})
 
     db.session.delete(warung)
     db.session.commit()
+    invalidate_catalog(warung_id, warung_list=True)
+    owned_warung_cache.invalidate(current_user.id)
+    # Keluarkan socket yang masih berada di room alert warung ini (di semua worker lewat message queue)
+    socketio.close_room(f'warung_{warung_id}')
+    catalog_deltas.publish(warung_id, deltas)
     
     return jsonify({'message': 'Warung and all its products deleted successfully'}), 200
 
 @app.route('/api/warung/<int:warung_id>', methods=['GET'])
+@read_replica
 def get_warung(warung_id):
-    warung = Warung.query.get(warung_id)
-    if not warung:
-        return jsonify({'error': 'Warung not found'}), 404
+    def build():
+        warung = Warung.query.get(warung_id)
+        if not warung:
+            return {'error': 'Warung not found'}, 404
+
+        produk_list = []
+        for produk in warung.produk:
+            produk_list.append({
+                'id': produk.id,
+                'nama': produk.nama,
+                'deskripsi': produk.deskripsi,
+                'harga': produk.harga,
+                'stok': produk.stok,
+                'gambar_url': produk.gambar_url
+            })
 
-    produk_list = []
-    for produk in warung.produk:
-        produk_list.append({
-            'id': produk.id,
-            'nama': produk.nama,
-            'deskripsi': produk.deskripsi,
-            'harga': produk.harga,
-            'stok': produk.stok,
-            'gambar_url': produk.gambar_url
-        })
+        return {
+            'warung': {
+                'id': warung.id,
+                'nama': warung.nama,
+                'deskripsi': warung.deskripsi,
+                'pemilik': warung.pemilik.username,
+                'produk': produk_list
+            }
+        }, 200
 
-    return jsonify({
-        'warung': {
-            'id': warung.id,
-            'nama': warung.nama,
-            'deskripsi': warung.deskripsi,
-            'pemilik': warung.pemilik.username,
-            'produk': produk_list
-        }
-    }), 200
+    return cached_json_response(f'warung:{warung_id}', 'detail', build)
 
 
 #  endpoint publik untuk semua warung
 @app.route('/api/warung', methods=['GET'])
+@read_replica
 def get_all_warung():
-    warung_list = Warung.query.all()
-    output = []
-    for warung in warung_list:
-        output.append({
-            'id': warung.id,
-            'nama': warung.nama,
-            'deskripsi': warung.deskripsi,
-            'pemilik': warung.pemilik.username
-        })
-    return jsonify({'warung': output}), 200
+    """
+    Mengambil daftar warung beserta nama pemilik dalam satu query join.
+    Paginasi keyset pada Warung.id: ?cursor=<id terakhir>&limit=<ukuran halaman>.
+    """
+    cursor = request.args.get('cursor', type=int)
+    limit = get_page_size()
+
+    def build():
+        query = db.session.query(
+            Warung.id, Warung.nama, Warung.deskripsi, User.username
+        ).join(User, Warung.pemilik_id == User.id)
+        if cursor:
+            query = query.filter(Warung.id > cursor)
+        rows = query.order_by(Warung.id).limit(limit + 1).all()
+
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        output = []
+        for row in rows[:limit]:
+            output.append({
+                'id': row.id,
+                'nama': row.nama,
+                'deskripsi': row.deskripsi,
+                'pemilik': row.username
+            })
+        return {'warung': output, 'next_cursor': next_cursor}, 200
+
+    return cached_json_response('warung_list', f'{cursor or 0}:{limit}', build)
 
 
 #  endpoint private (hanya warung milik user login)
@@ -424,26 +1568,29 @@ def get_my_warung(current_user):
     return jsonify(warungs_list), 200
 
 @app.route('/api/warung/<int:warung_id>/produk', methods=['GET'])
+@read_replica
 def get_produk_by_warung(warung_id):
     """
     Mengambil semua produk dari warung tertentu.
     """
-    warung = Warung.query.get(warung_id)
-    if not warung:
-        return jsonify([]), 200 # Kembalikan array kosong jika warung tidak ditemukan
+    def build():
+        warung = Warung.query.get(warung_id)
+        if not warung:
+            return [], 200 # Kembalikan array kosong jika warung tidak ditemukan
+
+        produk_list = []
+        for produk in warung.produk:
+            produk_list.append({
+                'id': produk.id,
+                'nama': produk.nama,
+                'deskripsi': produk.deskripsi,
+                'harga': produk.harga,
+                'stok': produk.stok,
+                'gambar_url': produk.gambar_url
+            })
+        return produk_list, 200
 
-    produk_list = []
-    for produk in warung.produk:
-        produk_list.append({
-            'id': produk.id,
-            'nama': produk.nama,
-            'deskripsi': produk.deskripsi,
-            'harga': produk.harga,
-            'stok': produk.stok,
-            'gambar_url': produk.gambar_url
-        })
-    
-    return jsonify(produk_list), 200
+    return cached_json_response(f'warung:{warung_id}', 'produk', build)
 
 @app.route('/api/produk', methods=['POST'])
 @token_required
@@ -480,6 +1627,8 @@ def add_produk(current_user):
 
     db.session.add(new_produk)
     db.session.commit()
+    invalidate_catalog(new_produk.warung_id)
+    catalog_deltas.publish(new_produk.warung_id, [produk_delta(new_produk)])
 
     return jsonify({
         'message': 'Produk created successfully',
@@ -517,10 +1666,177 @@ def create_produk(current_user):
         warung=current_user.warung
     )
     db.session.add(new_produk)
+    if gambar_url:
+        db.session.flush()
+        sync_upload_refs('produk', {new_produk.id: gambar_url})
     db.session.commit()
+    invalidate_catalog(new_produk.warung_id)
+    catalog_deltas.publish(new_produk.warung_id, [produk_delta(new_produk)])
 
     return jsonify({'message': 'Product created successfully!', 'produk_id': new_produk.id}), 201
 
+# --- Impor Produk Massal ---
+PRODUK_IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+def iter_import_rows(stream, fmt):
+    """
+    Membaca baris impor secara bertahap dari body request (tidak dimuat utuh ke memori).
+    Menghasilkan (nomor_baris, dict) atau (nomor_baris, None) untuk baris NDJSON yang bukan JSON.
+    """
+    # utf-8-sig membuang BOM yang ditambahkan ekspor CSV Excel/POS (jika tidak, header pertama jadi '\ufeffid')
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(text), start=1)
+        return
+    baris = 0
+    for line in text:
+        if not line.strip():
+            continue
+        baris += 1
+        try:
+            yield baris, json.loads(line)
+        except ValueError:
+            yield baris, None
+
+def clean_import_row(raw):
+    """
+    Validasi satu baris impor. Baris dengan 'id' memperbarui produk yang ada (kolom kosong diabaikan),
+    tanpa 'id' membuat produk baru. Mengembalikan (values, error).
+    """
+    if not isinstance(raw, dict):
+        return None, 'Baris tidak valid'
+
+    values = {}
+    try:
+        if raw.get('id') not in (None, ''):
+            values['id'] = int(raw['id'])
+        for field in ('nama', 'deskripsi', 'gambar_url'):
+            if raw.get(field) not in (None, ''):
+                values[field] = str(raw[field])
+        if raw.get('harga') not in (None, ''):
+            values['harga'] = float(raw['harga'])
+        if raw.get('stok') not in (None, ''):
+            values['stok'] = int(raw['stok'])
+    except (TypeError, ValueError):
+        return None, 'id, harga atau stok tidak valid'
+
+    if values.get('harga', 0) < 0 or values.get('stok', 0) < 0:
+        return None, 'Harga dan stok tidak boleh negatif'
+    if 'id' in values:
+        if len(values) == 1:
+            return None, 'Tidak ada kolom yang diubah'
+    elif not all(field in values for field in ('nama', 'harga', 'stok')):
+        return None, 'Produk baru membutuhkan nama, harga dan stok'
+    return values, None
+
+def flush_import_batch(warung_id, batch, report, changed_ids):
+    """
+    Menulis satu chunk baris valid: update by primary key dan insert ... returning,
+    masing-masing sebagai satu executemany. Produk yang bukan milik warung dilaporkan gagal.
+    """
+    updates = [(baris, values) for baris, values in batch if 'id' in values]
+    inserts = [(baris, values) for baris, values in batch if 'id' not in values]
+    gambar_urls = {}
+
+    if updates:
+        owned = {produk_id for (produk_id,) in db.session.query(Produk.id).filter(
+            Produk.warung_id == warung_id, Produk.id.in_({values['id'] for _, values in updates})
+        )}
+        rows = []
+        for baris, values in updates:
+            if values['id'] in owned:
+                rows.append(values)
+                report.append({'baris': baris, 'status': 'diperbarui', 'id': values['id']})
+                changed_ids.append(values['id'])
+                if 'gambar_url' in values:
+                    gambar_urls[values['id']] = values['gambar_url']
+            else:
+                report.append({'baris': baris, 'status': 'gagal', 'id': values['id'],
+                               'error': 'Produk tidak ditemukan di warung ini'})
+        if rows:
+            db.session.execute(update(Produk), rows)
+
+    if inserts:
+        rows = [{
+            'nama': values['nama'],
+            'deskripsi': values.get('deskripsi'),
+            'harga': values['harga'],
+            'stok': values['stok'],
+            'gambar_url': values.get('gambar_url'),
+            'warung_id': warung_id,
+        } for _, values in inserts]
+        new_ids = db.session.scalars(insert(Produk).returning(Produk.id, sort_by_parameter_order=True), rows).all()
+        for (baris, values), produk_id in zip(inserts, new_ids):
+            report.append({'baris': baris, 'status': 'dibuat', 'id': produk_id})
+            changed_ids.append(produk_id)
+            if 'gambar_url' in values:
+                gambar_urls[produk_id] = values['gambar_url']
+
+    if gambar_urls:
+        sync_upload_refs('produk', gambar_urls)
+
+@app.route('/api/warung/<int:warung_id>/produk/import', methods=['POST'])
+@token_required
+def import_produk(current_user, warung_id):
+    """
+    Impor/update produk massal dari body CSV (text/csv, baris header berisi nama kolom)
+    atau NDJSON (application/x-ndjson). Kolom: id (opsional, untuk update), nama, deskripsi, harga, stok, gambar_url.
+    Semua baris valid ditulis dalam satu transaksi; baris tidak valid dilewati dan dilaporkan per baris.
+    Body diterima utuh lebih dulu agar klien yang lambat tidak menahan kunci tulis database.
+    """
+    fmt = PRODUK_IMPORT_FORMATS.get(request.mimetype)
+    if not fmt:
+        return jsonify({'message': 'Content-Type harus text/csv atau application/x-ndjson'}), 415
+
+    # Kepemilikan dicek sekali untuk seluruh impor
+    warung = Warung.query.filter_by(id=warung_id, pemilik_id=current_user.id).first()
+    if not warung:
+        return jsonify({'message': 'Warung not found or unauthorized'}), 404
+
+    # Body impor boleh jauh lebih besar dari MAX_CONTENT_LENGTH biasa; diset sebelum stream dibaca
+    request.max_content_length = app.config['PRODUK_IMPORT_MAX_BYTES']
+    batch_size = app.config['PRODUK_IMPORT_BATCH_SIZE']
+
+    # Di SQLite kunci tulis diambil pada flush pertama dan baru lepas saat commit; bila body dibaca
+    # dari jaringan di antaranya, semua checkout menunggu upload selesai (dan gagal setelah busy_timeout)
+    with tempfile.SpooledTemporaryFile(max_size=app.config['PRODUK_IMPORT_SPOOL_MEMORY']) as spool:
+        shutil.copyfileobj(request.stream, spool, UPLOAD_CHUNK_SIZE)
+        spool.seek(0)
+
+        report = []
+        changed_ids = []
+        batch = []
+        for baris, raw in iter_import_rows(spool, fmt):
+            values, error = clean_import_row(raw)
+            if error:
+                report.append({'baris': baris, 'status': 'gagal', 'error': error})
+                continue
+            batch.append((baris, values))
+            if len(batch) >= batch_size:
+                flush_import_batch(warung.id, batch, report, changed_ids)
+                batch = []
+        if batch:
+            flush_import_batch(warung.id, batch, report, changed_ids)
+
+        db.session.commit()
+
+    if changed_ids:
+        invalidate_catalog(warung.id)
+        if len(changed_ids) <= app.config['PRODUK_IMPORT_DELTA_LIMIT']:
+            catalog_deltas.publish(warung.id, stock_deltas(changed_ids).get(warung.id, []))
+        else:
+            # Terlalu banyak untuk delta per produk; client cukup memuat ulang katalog
+            socketio.emit('katalog_refresh', {'warung_id': warung.id}, room=f'katalog_{warung.id}')
+
+    report.sort(key=lambda hasil: hasil['baris'])
+    ringkasan = {status: sum(1 for hasil in report if hasil['status'] == status)
+                 for status in ('dibuat', 'diperbarui', 'gagal')}
+    return jsonify({'warung_id': warung.id, **ringkasan, 'hasil': report}), 200
+
 @app.route('/api/produk/<int:produk_id>', methods=['DELETE'])
 @token_required
 def delete_produk(current_user, produk_id):
@@ -536,37 +1852,211 @@ def delete_produk(current_user, produk_id):
     if produk.warung.pemilik_id != current_user.id:
         return jsonify({'message': 'Unauthorized: You are not the owner of this product'}), 403
 
+    warung_id = produk.warung_id
+    delta = produk_delta(produk, dihapus=True)
     db.session.delete(produk)
+    sync_upload_refs('produk', {produk.id: None})
     db.session.commit()
+    invalidate_catalog(warung_id)
+    catalog_deltas.publish(warung_id, [delta])
     return jsonify({'message': 'Produk deleted successfully'}), 200
 
+# --- Helper Rekap Penjualan ---
+def dialect_insert(model):
+    """
+    insert() khusus dialek yang mendukung ON CONFLICT (SQLite dan PostgreSQL).
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def upsert_increment(model, index_elements, rows):
+    """
+    INSERT ... ON CONFLICT DO UPDATE yang menjumlahkan kolom non-kunci ke baris yang sudah ada.
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(model)
+    increments = {
+        column: getattr(model, column) + stmt.excluded[column]
+        for column in rows[0] if column not in index_elements
+    }
+    db.session.execute(stmt.on_conflict_do_update(index_elements=index_elements, set_=increments), rows)
+
+def record_sales_rollup(pesanan_list, detail_rows):
+    """
+    Menambahkan pesanan baru (sudah di-flush) beserta detailnya ke tabel rekap harian.
+    """
+    warung_rows = {}
+    pesanan_map = {}
+    for pesanan in pesanan_list:
+        pesanan_map[pesanan.id] = pesanan
+        selesai = pesanan.status == 'Selesai'
+        row = warung_rows.setdefault((pesanan.warung_id, pesanan.tanggal.date()), {
+            'warung_id': pesanan.warung_id,
+            'tanggal': pesanan.tanggal.date(),
+            'jumlah_pesanan': 0,
+            'pendapatan': 0.0,
+            'jumlah_selesai': 0,
+            'pendapatan_selesai': 0.0
+        })
+        row['jumlah_pesanan'] += 1
+        row['pendapatan'] += pesanan.total_harga
+        row['jumlah_selesai'] += 1 if selesai else 0
+        row['pendapatan_selesai'] += pesanan.total_harga if selesai else 0.0
+
+    produk_rows = {}
+    for detail in detail_rows:
+        pesanan = pesanan_map[detail['pesanan_id']]
+        row = produk_rows.setdefault((pesanan.warung_id, pesanan.tanggal.date(), detail['produk_id']), {
+            'warung_id': pesanan.warung_id,
+            'tanggal': pesanan.tanggal.date(),
+            'produk_id': detail['produk_id'],
+            'total_jumlah': 0,
+            'total_pendapatan': 0.0
+        })
+        row['total_jumlah'] += detail['jumlah']
+        row['total_pendapatan'] += detail['jumlah'] * detail['harga_satuan']
+
+    upsert_increment(RekapHarianWarung, ['warung_id', 'tanggal'], list(warung_rows.values()))
+    upsert_increment(RekapHarianProduk, ['warung_id', 'tanggal', 'produk_id'], list(produk_rows.values()))
+
+def record_status_rollup(pesanan, old_status, new_status):
+    """
+    Memindahkan pesanan masuk/keluar hitungan 'Selesai' pada rekap harian warung.
+    """
+    if (old_status == 'Selesai') == (new_status == 'Selesai'):
+        return
+    sign = 1 if new_status == 'Selesai' else -1
+    upsert_increment(RekapHarianWarung, ['warung_id', 'tanggal'], [{
+        'warung_id': pesanan.warung_id,
+        'tanggal': pesanan.tanggal.date(),
+        'jumlah_pesanan': 0,
+        'pendapatan': 0.0,
+        'jumlah_selesai': sign,
+        'pendapatan_selesai': sign * pesanan.total_harga
+    }])
+
+def append_order_events(alerts, jenis='new_order_alert'):
+    """
+    Menulis alert ke outbox OrderEvent dalam transaksi yang sedang berjalan.
+    Setiap alert mendapat event_id berikutnya dari urutan warung-nya.
+    """
+    for alert in alerts:
+        stmt = dialect_insert(WarungEventSeq).values(warung_id=alert['warung_id'], last_event_id=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['warung_id'],
+            set_={'last_event_id': WarungEventSeq.last_event_id + 1}
+        ).returning(WarungEventSeq.last_event_id)
+        alert['event_id'] = db.session.execute(stmt).scalar_one()
+
+    if alerts:
+        db.session.execute(insert(OrderEvent), [{
+            'warung_id': alert['warung_id'],
+            'event_id': alert['event_id'],
+            'jenis': jenis,
+            'payload': json.dumps(alert)
+        } for alert in alerts])
+
 # --- ENDPOINT KERANJANG & TRANSAKSI ---
+def reserve_stock(quantities):
+    """
+    Mengurangi stok beberapa produk dengan satu UPDATE ... WHERE stok >= jumlah.
+    quantities berisi {produk_id: jumlah}. Mengembalikan False bila ada produk yang
+    stoknya sudah tidak mencukupi; pemanggil wajib melakukan rollback.
+    """
+    if not quantities:
+        return True
+    jumlah = case(quantities, value=Produk.id)
+    result = db.session.execute(
+        update(Produk)
+        .where(Produk.id.in_(quantities.keys()), Produk.stok >= jumlah)
+        .values(stok=Produk.stok - jumlah)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
 @app.route('/api/keranjang/add', methods=['POST'])
 @token_required
 def add_to_cart(current_user):
-    data = request.get_json()
+    """
+    Menambahkan produk ke keranjang: {"produk_id", "jumlah"} untuk satu produk,
+    atau {"items": [{"produk_id", "jumlah"}, ...]} untuk banyak produk dalam satu transaksi.
+    """
+    data = request.get_json() or {}
+    if 'items' in data:
+        return add_items_to_cart(current_user, data['items'])
+
     produk_id = data.get('produk_id')
     jumlah = data.get('jumlah', 1)
+    if not isinstance(jumlah, int) or jumlah < 1:
+        return jsonify({'error': 'Invalid quantity'}), 400
+
+    # Satu statement: INSERT ... SELECT dari produk yang stoknya cukup, ON CONFLICT menambah jumlah.
+    # Unique index (user_id, produk_id) mencegah baris ganda saat dua request datang bersamaan.
+    stmt = dialect_insert(Keranjang).from_select(
+        ['user_id', 'produk_id', 'jumlah'],
+        db.select(literal(current_user.id), Produk.id, literal(jumlah))
+        .where(Produk.id == produk_id, Produk.stok >= jumlah)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'produk_id'],
+        set_={'jumlah': Keranjang.jumlah + stmt.excluded.jumlah}
+    )
+    result = db.session.execute(stmt)
 
-    produk = Produk.query.get(produk_id)
-    if not produk:
-        return jsonify({'error': 'Product not found'}), 404
-    
-    if produk.stok < jumlah:
+    if result.rowcount == 0:
+        # Tidak ada baris yang ditulis: bedakan produk tidak ada dari stok kurang
+        db.session.rollback()
+        if not db.session.query(Produk.id).filter_by(id=produk_id).first():
+            return jsonify({'error': 'Product not found'}), 404
         return jsonify({'error': 'Insufficient stock'}), 400
 
-    # Cek apakah produk sudah ada di keranjang user
-    keranjang_item = Keranjang.query.filter_by(user_id=current_user.id, produk_id=produk.id).first()
-    if keranjang_item:
-        keranjang_item.jumlah += jumlah
-    else:
-        keranjang_item = Keranjang(user_id=current_user.id, produk_id=produk.id, jumlah=jumlah)
-        db.session.add(keranjang_item)
-    
     db.session.commit()
     
     return jsonify({'message': 'Product added to cart successfully!'}), 200
 
+def add_items_to_cart(current_user, items):
+    """
+    Varian bulk add_to_cart: semua item divalidasi dengan satu query produk lalu
+    di-upsert sekaligus (executemany) dalam satu transaksi. Gagal seluruhnya jika ada item yang tidak valid.
+    """
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Items must be a non-empty list'}), 400
+
+    # Produk yang sama dijumlahkan lebih dulu agar satu baris upsert per produk
+    quantities = {}
+    for item in items:
+        produk_id = item.get('produk_id') if isinstance(item, dict) else None
+        jumlah = item.get('jumlah', 1) if isinstance(item, dict) else None
+        if not isinstance(produk_id, int) or not isinstance(jumlah, int) or jumlah < 1:
+            return jsonify({'error': 'Invalid item', 'item': item}), 400
+        quantities[produk_id] = quantities.get(produk_id, 0) + jumlah
+
+    stok_map = dict(
+        db.session.query(Produk.id, Produk.stok).filter(Produk.id.in_(quantities)).all()
+    )
+    errors = []
+    for produk_id, jumlah in quantities.items():
+        if produk_id not in stok_map:
+            errors.append({'produk_id': produk_id, 'error': 'Product not found'})
+        elif stok_map[produk_id] < jumlah:
+            errors.append({'produk_id': produk_id, 'error': 'Insufficient stock'})
+    if errors:
+        status = 404 if all(e['error'] == 'Product not found' for e in errors) else 400
+        return jsonify({'error': 'Some items could not be added', 'errors': errors}), status
+
+    upsert_increment(Keranjang, ['user_id', 'produk_id'], [
+        {'user_id': current_user.id, 'produk_id': produk_id, 'jumlah': jumlah}
+        for produk_id, jumlah in quantities.items()
+    ])
+    db.session.commit()
+
+    return jsonify({
+        'message': f'{len(quantities)} products added to cart successfully!',
+        'jumlah_produk': len(quantities)
+    }), 200
+
 @app.route('/api/produk/<int:produk_id>', methods=['PUT'])
 @token_required
 def update_produk(current_user, produk_id):
@@ -595,8 +2085,12 @@ def update_produk(current_user, produk_id):
         produk.stok = data['stok']
     if 'gambar_url' in data:
         produk.gambar_url = data['gambar_url']
+        sync_upload_refs('produk', {produk.id: data['gambar_url']})
 
     db.session.commit()
+    invalidate_catalog(produk.warung_id)
+    if 'stok' in data or 'harga' in data:
+        catalog_deltas.publish(produk.warung_id, [produk_delta(produk)])
     
     return jsonify({
         'message': 'Produk updated successfully',
@@ -608,25 +2102,74 @@ def update_produk(current_user, produk_id):
         'warung_id': produk.warung_id
     }), 200
 
+@app.route('/api/produk/<int:produk_id>/gambar', methods=['POST'])
+@token_required
+def upload_produk_gambar(current_user, produk_id):
+    """
+    Upload gambar produk (field multipart 'gambar') dan set gambar_url produk. Hanya pemilik warung.
+    """
+    produk = Produk.query.get(produk_id)
+    if not produk:
+        return jsonify({'message': 'Produk not found'}), 404
+
+    if produk.warung.pemilik_id != current_user.id:
+        return jsonify({'message': 'Unauthorized: You are not the owner of this product'}), 403
+
+    if 'gambar' not in request.files or request.files['gambar'].filename == '':
+        return jsonify({'error': 'No file part or no selected file'}), 400
+
+    try:
+        unique_filename = save_uploaded_image(request.files['gambar'])
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
+
+    produk.gambar_url = upload_url(unique_filename)
+    sync_upload_refs('produk', {produk.id: produk.gambar_url})
+    db.session.commit()
+    invalidate_catalog(produk.warung_id)
+
+    return jsonify({'gambar_url': produk.gambar_url, 'variants': image_variant_urls(produk.gambar_url)}), 200
+
 @app.route('/api/keranjang', methods=['GET'])
 @token_required
 def view_cart(current_user):
-    keranjang_items = Keranjang.query.filter_by(user_id=current_user.id).all()
+    """
+    Isi keranjang beserta subtotal dan ketersediaan stok per item, dibaca dengan satu query join.
+    stok_cukup/siap_checkout memungkinkan client melewati validasi terpisah sebelum checkout.
+    """
+    keranjang_items = db.session.query(
+        Keranjang.produk_id,
+        Produk.nama,
+        Produk.harga,
+        Keranjang.jumlah,
+        (Produk.harga * Keranjang.jumlah).label('subtotal'),
+        Produk.stok,
+        Produk.warung_id
+    ).join(Produk, Keranjang.produk_id == Produk.id).filter(
+        Keranjang.user_id == current_user.id
+    ).order_by(Keranjang.id).all()
+
     output = []
     total_harga = 0
     for item in keranjang_items:
         output.append({
-            'produk_id': item.produk.id,
-            'nama_produk': item.produk.nama,
-            'harga_satuan': item.produk.harga,
+            'produk_id': item.produk_id,
+            'nama_produk': item.nama,
+            'harga_satuan': item.harga,
             'jumlah': item.jumlah,
-            'subtotal': item.produk.harga * item.jumlah
+            'subtotal': item.subtotal,
+            'warung_id': item.warung_id,
+            'stok_tersedia': item.stok,
+            'stok_cukup': item.stok >= item.jumlah
         })
-        total_harga += item.produk.harga * item.jumlah
+        total_harga += item.subtotal
     
     return jsonify({
         'keranjang': output,
-        'total_harga': total_harga
+        'total_harga': total_harga,
+        'siap_checkout': bool(output) and all(item['stok_cukup'] for item in output)
     }), 200
 
 @app.route('/api/keranjang/checkout', methods=['POST'])
@@ -643,71 +2186,87 @@ def checkout(current_user):
     if not alamat_pengiriman:
         return jsonify({"message": "Alamat pengiriman tidak boleh kosong"}), 400
 
+    # Gabungkan jumlah per produk lalu ambil semua produk dengan satu query IN
+    quantities = {}
+    for item in keranjang_items:
+        quantities[item.produk_id] = quantities.get(item.produk_id, 0) + item.jumlah
+    # Nama warung ikut diambil untuk alert, tanpa lazy load per pesanan
+    produk_map = {}
+    warung_nama = {}
+    for produk, nama_warung in db.session.query(Produk, Warung.nama).join(
+        Warung, Produk.warung_id == Warung.id
+    ).filter(Produk.id.in_(quantities.keys())):
+        produk_map[produk.id] = produk
+        warung_nama[produk.warung_id] = nama_warung
+
     # Kelompokkan item keranjang berdasarkan warung
     items_by_warung = {}
-    for item in keranjang_items:
-        produk = Produk.query.get(item.produk_id)
+    for produk_id, jumlah in quantities.items():
+        produk = produk_map.get(produk_id)
         if not produk:
             return jsonify({"message": "Produk tidak ditemukan"}), 404
         
         # Cek stok
-        if produk.stok < item.jumlah:
+        if produk.stok < jumlah:
             return jsonify({"message": f"Stok produk {produk.nama} tidak mencukupi"}), 400
 
-        warung_id = produk.warung_id
-        if warung_id not in items_by_warung:
-            items_by_warung[warung_id] = []
-        items_by_warung[warung_id].append(item)
+        items_by_warung.setdefault(produk.warung_id, []).append((produk, jumlah))
+
+    # Kurangi stok secara atomik; gagal bila checkout lain lebih dulu menghabiskan stok
+    if not reserve_stock(quantities):
+        db.session.rollback()
+        return jsonify({"message": "Stok produk tidak mencukupi"}), 400
 
     # Buat pesanan terpisah untuk setiap warung
     list_pesanan_baru = []
     for warung_id, items in items_by_warung.items():
-        total_harga_pesanan = 0
-        for item in items:
-            produk = Produk.query.get(item.produk_id)
-            total_harga_pesanan += produk.harga * item.jumlah
-
-        new_pesanan = Pesanan(
+        list_pesanan_baru.append(Pesanan(
             user_id=current_user.id,
             warung_id=warung_id,
             alamat_pengiriman=alamat_pengiriman,
-            total_harga=total_harga_pesanan,
+            total_harga=sum(produk.harga * jumlah for produk, jumlah in items),
             status=status_awal # Menggunakan status dari request
-        )
-        db.session.add(new_pesanan)
-        db.session.flush()
+        ))
+    db.session.add_all(list_pesanan_baru)
+    db.session.flush()
 
-        # Tambahkan detail pesanan dan kurangi stok
-        for item in items:
-            produk = Produk.query.get(item.produk_id)
-            detail_pesanan = DetailPesanan(
-                pesanan_id=new_pesanan.id,
-                produk_id=produk.id,
-                jumlah=item.jumlah,
-                harga_satuan=produk.harga
-            )
-            db.session.add(detail_pesanan)
-            produk.stok -= item.jumlah
-
-        list_pesanan_baru.append(new_pesanan)
+    # Tambahkan detail pesanan dengan satu bulk insert
+    detail_rows = []
+    for pesanan in list_pesanan_baru:
+        for produk, jumlah in items_by_warung[pesanan.warung_id]:
+            detail_rows.append({
+                'pesanan_id': pesanan.id,
+                'produk_id': produk.id,
+                'jumlah': jumlah,
+                'harga_satuan': produk.harga
+            })
+    db.session.execute(insert(DetailPesanan), detail_rows)
+    record_sales_rollup(list_pesanan_baru, detail_rows)
+
+    # Siapkan alert sebelum commit, selagi atribut pesanan belum kedaluwarsa
+    alerts = [{
+        'pesanan_id': pesanan.id,
+        'pemesan': current_user.username,
+        'total_harga': pesanan.total_harga,
+        'warung_id': pesanan.warung_id,
+        'warung_nama': warung_nama[pesanan.warung_id]
+    } for pesanan in list_pesanan_baru]
+    append_order_events(alerts)
+    deltas = stock_deltas(quantities.keys())
 
     # Hapus item dari keranjang
-    for item in keranjang_items:
-        db.session.delete(item)
+    Keranjang.query.filter_by(user_id=current_user.id).delete(synchronize_session=False)
 
     db.session.commit()
+    invalidate_catalog(*items_by_warung.keys())
+    for warung_id, warung_deltas in deltas.items():
+        catalog_deltas.publish(warung_id, warung_deltas)
 
     # Kirim notifikasi ke setiap warung yang terlibat
-    for pesanan in list_pesanan_baru:
-        socketio.emit('new_order_alert', {
-            'pesanan_id': pesanan.id,
-            'pemesan': current_user.username,
-            'total_harga': pesanan.total_harga,
-            'warung_id': pesanan.warung_id,
-            'warung_nama': pesanan.warung.nama
-        }, room=f'warung_{pesanan.warung_id}')
+    for alert in alerts:
+        order_alerts.enqueue(f"warung_{alert['warung_id']}", alert)
     
-    return jsonify({"message": f"{len(list_pesanan_baru)} pesanan berhasil dibuat."}), 200
+    return jsonify({"message": f"{len(alerts)} pesanan berhasil dibuat."}), 200
 
 @app.route('/api/checkout/local', methods=['POST'])
 @token_required
@@ -742,9 +2301,16 @@ def checkout_local(current_user):
         return jsonify({"success": False, "message": "Warung tidak ditemukan"}), 404
     
     try:
-        # Validasi dan hitung ulang total harga
+        # Ambil semua produk dengan satu query, lalu validasi terhadap map di memori
+        produk_ids = {item.get('produk_id') for item in items if item.get('produk_id')}
+        produk_map = {p.id: p for p in Produk.query.filter(Produk.id.in_(produk_ids)).all()}
+
+        # Validasi dan hitung ulang total harga; semua kesalahan dikumpulkan
         total_harga_server = 0
         validated_items = []
+        quantities = {}
+        errors = []
+        not_found = 0
         
         for item in items:
             produk_id = item.get('produk_id')
@@ -752,42 +2318,34 @@ def checkout_local(current_user):
             harga_satuan_client = item.get('harga_satuan')
             
             if not all([produk_id, jumlah, harga_satuan_client]):
-                return jsonify({
-                    "success": False, 
-                    "message": "Data item tidak lengkap"
-                }), 400
+                errors.append("Data item tidak lengkap")
+                continue
+
+            # Jumlah negatif akan lolos stok >= jumlah dan justru menambah stok
+            if not isinstance(jumlah, int) or jumlah < 1:
+                errors.append(f"Jumlah produk dengan ID {produk_id} tidak valid")
+                continue
             
             # Validasi produk
-            produk = Produk.query.get(produk_id)
+            produk = produk_map.get(produk_id)
             if not produk:
-                return jsonify({
-                    "success": False, 
-                    "message": f"Produk dengan ID {produk_id} tidak ditemukan"
-                }), 404
+                errors.append(f"Produk dengan ID {produk_id} tidak ditemukan")
+                not_found += 1
+                continue
             
             # Validasi produk belongs to warung
             if produk.warung_id != warung_id:
-                return jsonify({
-                    "success": False, 
-                    "message": f"Produk {produk.nama} bukan milik warung ini"
-                }), 400
-            
-            # Validasi stok
-            if produk.stok < jumlah:
-                return jsonify({
-                    "success": False, 
-                    "message": f"Stok produk {produk.nama} tidak mencukupi. Stok tersedia: {produk.stok}"
-                }), 400
+                errors.append(f"Produk {produk.nama} bukan milik warung ini")
+                continue
             
             # Validasi harga (untuk keamanan)
             if abs(produk.harga - harga_satuan_client) > 0.01:  # Toleransi 1 sen
-                return jsonify({
-                    "success": False, 
-                    "message": f"Harga produk {produk.nama} tidak sesuai"
-                }), 400
+                errors.append(f"Harga produk {produk.nama} tidak sesuai")
+                continue
             
             subtotal = produk.harga * jumlah
             total_harga_server += subtotal
+            quantities[produk.id] = quantities.get(produk.id, 0) + jumlah
             
             validated_items.append({
                 'produk': produk,
@@ -796,6 +2354,19 @@ def checkout_local(current_user):
                 'subtotal': subtotal
             })
         
+        # Validasi stok terhadap total jumlah per produk
+        for produk_id, jumlah in quantities.items():
+            produk = produk_map[produk_id]
+            if produk.stok < jumlah:
+                errors.append(f"Stok produk {produk.nama} tidak mencukupi. Stok tersedia: {produk.stok}")
+        
+        if errors:
+            return jsonify({
+                "success": False, 
+                "message": errors[0],
+                "errors": errors
+            }), 404 if not_found == len(errors) else 400
+        
         # Validasi total harga (toleransi 1 rupiah)
         if abs(total_harga_server - total_harga_client) > 1:
             return jsonify({
@@ -803,6 +2374,14 @@ def checkout_local(current_user):
                 "message": f"Total harga tidak sesuai. Server: {total_harga_server}, Client: {total_harga_client}"
             }), 400
         
+        # Kurangi stok secara atomik sebelum pesanan dibuat
+        if not reserve_stock(quantities):
+            db.session.rollback()
+            return jsonify({
+                "success": False, 
+                "message": "Stok produk tidak mencukupi"
+            }), 400
+        
         # Buat pesanan baru
         new_pesanan = Pesanan(
             user_id=current_user.id,
@@ -814,39 +2393,36 @@ def checkout_local(current_user):
         db.session.add(new_pesanan)
         db.session.flush()  # Untuk mendapatkan ID pesanan
         
-        # Tambahkan detail pesanan dan kurangi stok
-        for item_data in validated_items:
-            produk = item_data['produk']
-            jumlah = item_data['jumlah']
-            harga_satuan = item_data['harga_satuan']
-            
-            # Buat detail pesanan
-            detail_pesanan = DetailPesanan(
-                pesanan_id=new_pesanan.id,
-                produk_id=produk.id,
-                jumlah=jumlah,
-                harga_satuan=harga_satuan
-            )
-            db.session.add(detail_pesanan)
-            
-            # Kurangi stok
-            produk.stok -= jumlah
-        
-        db.session.commit()
+        # Tambahkan detail pesanan dengan satu bulk insert
+        detail_rows = [{
+            'pesanan_id': new_pesanan.id,
+            'produk_id': item_data['produk'].id,
+            'jumlah': item_data['jumlah'],
+            'harga_satuan': item_data['harga_satuan']
+        } for item_data in validated_items]
+        db.session.execute(insert(DetailPesanan), detail_rows)
+        record_sales_rollup([new_pesanan], detail_rows)
         
-        # Kirim notifikasi ke warung
-        socketio.emit('new_order_alert', {
+        alert = {
             'pesanan_id': new_pesanan.id,
             'pemesan': current_user.username,
-            'total_harga': new_pesanan.total_harga,
-            'warung_id': new_pesanan.warung_id,
+            'total_harga': total_harga_server,
+            'warung_id': warung.id,
             'warung_nama': warung.nama
-        }, room=f'warung_{warung_id}')
+        }
+        append_order_events([alert])
+        deltas = stock_deltas(quantities.keys())
+        db.session.commit()
+        invalidate_catalog(warung_id)
+        catalog_deltas.publish(warung.id, deltas.get(warung.id, []))
+        
+        # Kirim notifikasi ke warung
+        order_alerts.enqueue(f'warung_{warung_id}', alert)
         
         return jsonify({
             "success": True,
             "message": "Pesanan berhasil dibuat",
-            "pesanan_id": new_pesanan.id,
+            "pesanan_id": alert['pesanan_id'],
             "total_harga": total_harga_server
         }), 200
         
@@ -857,32 +2433,68 @@ def checkout_local(current_user):
             "success": False,
             "message": "Terjadi kesalahan saat memproses pesanan"
         }), 500
+def serialize_pesanan(pesanan, with_pemesan=False):
+    """
+    Mengubah Pesanan beserta detailnya menjadi dict untuk respons riwayat dan daftar pesanan warung.
+    """
+    detail_list = []
+    for detail in pesanan.detail_pesanan:
+        detail_list.append({
+            "produk_nama": detail.produk.nama if detail.produk else 'Produk tidak ditemukan',
+            "jumlah": detail.jumlah,
+            "harga_satuan": detail.harga_satuan
+        })
+
+    order_data = {
+        "pesanan_id": pesanan.id,
+        "tanggal": pesanan.tanggal.isoformat(),
+        "status": pesanan.status,
+        "total_harga": pesanan.total_harga,
+        "alamat_pengiriman": pesanan.alamat_pengiriman
+    }
+    if with_pemesan:
+        order_data["pemesan"] = pesanan.user.username
+    order_data["detail_pesanan"] = detail_list
+    return order_data
+
 @app.route('/api/transaksi', methods=['GET'])
 @token_required
 def get_transaksi_history(current_user):
-    pesanan_user = Pesanan.query.filter_by(user_id=current_user.id).order_by(Pesanan.tanggal.desc()).all()
+    """
+    Mengambil riwayat pesanan pengguna per halaman, terbaru lebih dulu.
+    Paginasi keyset pada (tanggal, id) lewat ?cursor=, dengan filter opsional
+    ?status=, ?start_date= dan ?end_date=. Dengan ?stream=1 seluruh riwayat yang
+    cocok dialirkan sebagai NDJSON.
+    """
+    try:
+        start, end = get_date_range()
+        cursor = decode_pesanan_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'message': 'Parameter cursor atau tanggal tidak valid'}), 400
+    limit = get_page_size()
+
+    # Detail dan produknya dimuat dengan selectinload: jumlah query tetap per halaman
+    query = Pesanan.query.options(
+        selectinload(Pesanan.detail_pesanan).selectinload(DetailPesanan.produk)
+    ).filter(Pesanan.user_id == current_user.id)
+    if request.args.get('status'):
+        query = query.filter(Pesanan.status == request.args['status'])
+    if start:
+        query = query.filter(Pesanan.tanggal >= start)
+    if end:
+        query = query.filter(Pesanan.tanggal < end)
+    if wants_stream():
+        query = query.order_by(Pesanan.tanggal.desc(), Pesanan.id.desc()).yield_per(500)
+        return ndjson_response(serialize_pesanan(pesanan) for pesanan in query)
+    if cursor:
+        query = query.filter(tuple_(Pesanan.tanggal, Pesanan.id) < tuple_(*cursor))
+    pesanan_user = query.order_by(Pesanan.tanggal.desc(), Pesanan.id.desc()).limit(limit + 1).all()
+
+    next_cursor = encode_pesanan_cursor(pesanan_user[limit - 1]) if len(pesanan_user) > limit else None
     
-    history_list = []
-    for pesanan in pesanan_user:
-        detail_list = []
-        for detail in pesanan.detail_pesanan:
-            produk = Produk.query.get(detail.produk_id)
-            detail_list.append({
-                "produk_nama": produk.nama if produk else 'Produk tidak ditemukan',
-                "jumlah": detail.jumlah,
-                "harga_satuan": detail.harga_satuan
-            })
-        
-        history_list.append({
-            "pesanan_id": pesanan.id,
-            "tanggal": pesanan.tanggal.isoformat(),
-            "status": pesanan.status,
-            "total_harga": pesanan.total_harga,
-            "alamat_pengiriman": pesanan.alamat_pengiriman,
-            "detail_pesanan": detail_list
-        })
+    history_list = [serialize_pesanan(pesanan) for pesanan in pesanan_user[:limit]]
     
-    return jsonify(transaksi_history=history_list)
+    return jsonify(transaksi_history=history_list, next_cursor=next_cursor)
 
 # --- Endpoint melihat pesanan dari user ---
 @app.route('/api/warung/<int:warung_id>/pesanan', methods=['GET'])
@@ -890,6 +2502,7 @@ def get_transaksi_history(current_user):
 def get_warung_orders(current_user, warung_id):
     """
     Mengambil semua pesanan yang terkait dengan warung tertentu milik pengguna yang sedang login.
+    Gunakan ?stream=1 atau Accept: application/x-ndjson untuk menerima NDJSON bertahap.
     """
     warung = Warung.query.filter_by(id=warung_id, pemilik_id=current_user.id).first()
     
@@ -897,33 +2510,19 @@ def get_warung_orders(current_user, warung_id):
         # Menangani kasus warung tidak ditemukan ATAU bukan milik user
         return jsonify({'message': 'Warung not found or unauthorized'}), 404
 
-    # Ambil pesanan dengan efisien
-    pesanan_warung = Pesanan.query.filter_by(warung_id=warung.id).order_by(Pesanan.tanggal.desc()).all()
+    # Ambil pesanan dengan efisien; detail, produk dan pemesan dimuat per batch
+    query = Pesanan.query.options(
+        selectinload(Pesanan.detail_pesanan).selectinload(DetailPesanan.produk),
+        selectinload(Pesanan.user)
+    ).filter_by(warung_id=warung.id).order_by(Pesanan.tanggal.desc())
+
+    if wants_stream():
+        # Mode streaming: satu pesanan per baris NDJSON, tidak dikelompokkan per status
+        return ndjson_response(serialize_pesanan(pesanan, with_pemesan=True) for pesanan in query.yield_per(500))
 
     orders_by_status = {}
-    for pesanan in pesanan_warung:
-        detail_list = []
-        for detail in pesanan.detail_pesanan:
-            detail_list.append({
-                "produk_nama": detail.produk.nama, # Diasumsikan relasi produk ada
-                "jumlah": detail.jumlah,
-                "harga_satuan": detail.harga_satuan
-            })
-        
-        order_data = {
-            "pesanan_id": pesanan.id,
-            "tanggal": pesanan.tanggal.isoformat(),
-            "status": pesanan.status,
-            "total_harga": pesanan.total_harga,
-            "alamat_pengiriman": pesanan.alamat_pengiriman,
-            "pemesan": pesanan.user.username, # Diasumsikan relasi user ada
-            "detail_pesanan": detail_list
-        }
-        
-        status = pesanan.status
-        if status not in orders_by_status:
-            orders_by_status[status] = []
-        orders_by_status[status].append(order_data)
+    for pesanan in query.all():
+        orders_by_status.setdefault(pesanan.status, []).append(serialize_pesanan(pesanan, with_pemesan=True))
 
     return jsonify(orders_by_status), 200
 
@@ -947,7 +2546,16 @@ def update_pesanan_status(current_user, pesanan_id):
     valid_statuses = ['Menunggu Pembayaran','Menunggu Konfirmasi', 'Diproses', 'Dikirim', 'Selesai', 'Dibatalkan']
     
     if new_status and new_status in valid_statuses:
-        pesanan.status = new_status
+        # UPDATE bersyarat pada status lama: dari dua perubahan bersamaan hanya satu yang
+        # menulis, sehingga delta rekap tidak pernah diterapkan dua kali
+        old_status = pesanan.status
+        result = db.session.execute(
+            update(Pesanan).where(Pesanan.id == pesanan.id, Pesanan.status == old_status).values(status=new_status)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return jsonify({'message': 'Status pesanan sudah diubah oleh permintaan lain, silakan muat ulang'}), 409
+        record_status_rollup(pesanan, old_status, new_status)
         db.session.commit()
         return jsonify({'message': 'Status pesanan berhasil diupdate', 'new_status': new_status}), 200
     
@@ -957,37 +2565,63 @@ def update_pesanan_status(current_user, pesanan_id):
 def get_warung_dashboard(current_user):
     """
     Mengambil data ringkasan penjualan untuk semua warung milik pengguna.
+    Metrik dibaca dari tabel rekap harian (O(hari), bukan O(pesanan)).
+    Filter opsional ?start_date= dan ?end_date= (YYYY-MM-DD) membatasi tanggal pesanan.
     """
+    try:
+        start, end = get_date_range()
+    except ValueError:
+        return jsonify({'message': 'Format tanggal tidak valid, gunakan YYYY-MM-DD'}), 400
+
     # Ambil semua warung yang dimiliki oleh pengguna saat ini
     warungs = Warung.query.filter_by(pemilik_id=current_user.id).all()
-    dashboard_data = {}
+    if not warungs:
+        return jsonify({}), 200
+    warung_ids = [w.id for w in warungs]
 
-    for warung in warungs:
-        # Cari semua pesanan untuk warung ini
-        pesanan_list = Pesanan.query.filter_by(warung_id=warung.id).all()
-        
-        # Hitung metrik
-        total_orders = len(pesanan_list)
-        total_revenue = sum(p.total_harga for p in pesanan_list)
-
-        # Hitung penjualan per produk
-        sales_per_product = {}
-        for pesanan in pesanan_list:
-            for detail in pesanan.detail_pesanan:
-                produk_nama = detail.produk.nama
-                if produk_nama not in sales_per_product:
-                    sales_per_product[produk_nama] = {
-                        'total_jumlah': 0,
-                        'total_pendapatan': 0.0
-                    }
-                sales_per_product[produk_nama]['total_jumlah'] += detail.jumlah
-                sales_per_product[produk_nama]['total_pendapatan'] += detail.jumlah * detail.harga_satuan
+    def rekap_filter(query, model):
+        query = query.filter(model.warung_id.in_(warung_ids))
+        if start:
+            query = query.filter(model.tanggal >= start.date())
+        if end:
+            query = query.filter(model.tanggal < end.date())
+        return query
+
+    # Jumlah pesanan dan pendapatan per warung
+    order_stats = {
+        row.warung_id: row for row in rekap_filter(db.session.query(
+            RekapHarianWarung.warung_id,
+            func.sum(RekapHarianWarung.jumlah_pesanan).label('total_pesanan'),
+            func.sum(RekapHarianWarung.pendapatan).label('total_pendapatan')
+        ), RekapHarianWarung).group_by(RekapHarianWarung.warung_id)
+    }
+
+    # Penjualan per produk, dikunci dengan produk_id agar produk yang diganti nama tidak bertabrakan
+    product_stats = rekap_filter(db.session.query(
+        RekapHarianProduk.warung_id,
+        RekapHarianProduk.produk_id,
+        Produk.nama,
+        func.sum(RekapHarianProduk.total_jumlah).label('total_jumlah'),
+        func.sum(RekapHarianProduk.total_pendapatan).label('total_pendapatan')
+    ).outerjoin(Produk, RekapHarianProduk.produk_id == Produk.id), RekapHarianProduk
+    ).group_by(RekapHarianProduk.warung_id, RekapHarianProduk.produk_id, Produk.nama)
+
+    sales_per_warung = {}
+    for row in product_stats:
+        sales_per_warung.setdefault(row.warung_id, {})[row.produk_id] = {
+            'produk_nama': row.nama or 'Produk tidak ditemukan',
+            'total_jumlah': row.total_jumlah,
+            'total_pendapatan': row.total_pendapatan
+        }
 
+    dashboard_data = {}
+    for warung in warungs:
+        stats = order_stats.get(warung.id)
         dashboard_data[warung.nama] = {
             'warung_id': warung.id,
-            'total_pesanan': total_orders,
-            'total_pendapatan': total_revenue,
-            'penjualan_per_produk': sales_per_product
+            'total_pesanan': stats.total_pesanan if stats else 0,
+            'total_pendapatan': stats.total_pendapatan if stats else 0.0,
+            'penjualan_per_produk': sales_per_warung.get(warung.id, {})
         }
 
     return jsonify(dashboard_data), 200
@@ -1005,14 +2639,11 @@ def get_wallet_summary(current_user):
     if not warung_ids:
         return jsonify({'total_transaksi': 0, 'total_pendapatan': 0.0}), 200
 
-    # Dapatkan semua pesanan yang sudah selesai dari warung-warung tersebut
-    pesanan_selesai = Pesanan.query.filter(
-        Pesanan.warung_id.in_(warung_ids),
-        Pesanan.status == 'Selesai'
-    ).all()
-
-    total_transaksi = len(pesanan_selesai)
-    total_pendapatan = sum(p.total_harga for p in pesanan_selesai)
+    # Jumlahkan pesanan selesai dari rekap harian warung-warung tersebut
+    total_transaksi, total_pendapatan = db.session.query(
+        func.coalesce(func.sum(RekapHarianWarung.jumlah_selesai), 0),
+        func.coalesce(func.sum(RekapHarianWarung.pendapatan_selesai), 0.0)
+    ).filter(RekapHarianWarung.warung_id.in_(warung_ids)).one()
 
     return jsonify({
         'total_transaksi': total_transaksi,
@@ -1020,5 +2651,232 @@ def get_wallet_summary(current_user):
     }), 200
 
 
+@app.route('/api/metrics/order-alerts', methods=['GET'])
+@token_required
+def get_order_alert_metrics(current_user):
+    """
+    Statistik dispatcher alert pesanan di proses ini: jumlah terkirim, panjang antrean, latency p50/p99.
+    Hanya tersedia bila METRICS_ENABLED aktif, dan hanya untuk pengguna yang login.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'message': 'Not found'}), 404
+    return jsonify(order_alerts.metrics()), 200
+
+
+# --- Perintah CLI ---
+@app.cli.command('init-db')
+def init_db_command():
+    """
+    Membuat tabel database yang belum ada dan menjalankan migrasi yang tertunda.
+    """
+    for versi, nama in init_db():
+        click.echo(f'Migrasi {versi}: {nama}')
+    click.echo('Tabel database siap.')
+
+def compute_sales_rollup(connection):
+    """
+    Menghitung rekap harian langsung dari Pesanan/DetailPesanan.
+    Mengembalikan (rekap_warung, rekap_produk) berupa dict berkunci sama dengan primary key tabel rekap.
+    """
+    def as_date(value):
+        # func.date() mengembalikan string di SQLite dan date di PostgreSQL
+        return value if isinstance(value, date) else date.fromisoformat(value)
+
+    tanggal = func.date(Pesanan.tanggal)
+    selesai = Pesanan.status == 'Selesai'
+    rekap_warung = {}
+    for row in connection.execute(db.select(
+        Pesanan.warung_id, tanggal,
+        func.count(Pesanan.id),
+        func.sum(Pesanan.total_harga),
+        func.sum(case((selesai, 1), else_=0)),
+        func.sum(case((selesai, Pesanan.total_harga), else_=0.0))
+    ).group_by(Pesanan.warung_id, tanggal)):
+        rekap_warung[(row[0], as_date(row[1]))] = {
+            'jumlah_pesanan': row[2],
+            'pendapatan': row[3],
+            'jumlah_selesai': row[4],
+            'pendapatan_selesai': row[5]
+        }
+
+    rekap_produk = {}
+    for row in connection.execute(db.select(
+        Pesanan.warung_id, tanggal, DetailPesanan.produk_id,
+        func.sum(DetailPesanan.jumlah),
+        func.sum(DetailPesanan.jumlah * DetailPesanan.harga_satuan)
+    ).join(Pesanan, DetailPesanan.pesanan_id == Pesanan.id).group_by(Pesanan.warung_id, tanggal, DetailPesanan.produk_id)):
+        rekap_produk[(row[0], as_date(row[1]), row[2])] = {
+            'total_jumlah': row[3],
+            'total_pendapatan': row[4]
+        }
+    return rekap_warung, rekap_produk
+
+def rebuild_sales_rollup(connection):
+    """
+    Menulis ulang tabel rekap dari Pesanan/DetailPesanan dalam transaksi `connection`.
+    Penulis rekap dikunci sebelum data pesanan dibaca, sehingga increment dari checkout atau
+    perubahan status yang commit selama rebuild tidak hilang: PostgreSQL memakai LOCK TABLE
+    (checkout menunggu di upsert rekap, pembaca tetap jalan), SQLite mengambil kunci tulis
+    database lewat DELETE sebelum membaca.
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('LOCK TABLE rekap_harian_warung, rekap_harian_produk IN EXCLUSIVE MODE'))
+    connection.execute(delete(RekapHarianWarung))
+    connection.execute(delete(RekapHarianProduk))
+
+    rekap_warung, rekap_produk = compute_sales_rollup(connection)
+    if rekap_warung:
+        connection.execute(insert(RekapHarianWarung), [
+            {'warung_id': warung_id, 'tanggal': tanggal, **values}
+            for (warung_id, tanggal), values in rekap_warung.items()
+        ])
+    if rekap_produk:
+        connection.execute(insert(RekapHarianProduk), [
+            {'warung_id': warung_id, 'tanggal': tanggal, 'produk_id': produk_id, **values}
+            for (warung_id, tanggal, produk_id), values in rekap_produk.items()
+        ])
+    return rekap_warung, rekap_produk
+
+@app.cli.command('refresh-replica')
+@click.option('--interval', default=0, show_default=True, help='Ulangi setiap sekian detik; 0 = sekali saja.')
+def refresh_replica_command(interval):
+    """
+    Menyalin database SQLite primary ke file replica dengan backup API SQLite.
+    Untuk menjalankan routing replica secara lokal dengan dua file SQLite.
+    """
+    if 'replica' not in app.config['SQLALCHEMY_BINDS']:
+        raise SystemExit('REPLICA_DATABASE_URL belum dikonfigurasi.')
+    primary, replica = db.engine, db.engines['replica']
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise SystemExit('refresh-replica hanya untuk primary dan replica SQLite.')
+
+    while True:
+        source = sqlite3.connect(primary.url.database)
+        target = sqlite3.connect(replica.url.database)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        click.echo(f'Replica diperbarui {datetime.utcnow().isoformat()}')
+        if not interval:
+            break
+        time.sleep(interval)
+
+@app.cli.command('rebuild-rollup')
+@click.option('--verify-only', is_flag=True, help='Hanya bandingkan rekap dengan data mentah tanpa menulis ulang.')
+def rebuild_rollup_command(verify_only):
+    """
+    Menghitung ulang tabel rekap harian dari Pesanan/DetailPesanan lalu memverifikasinya.
+    """
+    if verify_only:
+        with db.engine.connect() as connection:
+            rekap_warung, rekap_produk = compute_sales_rollup(connection)
+    else:
+        with db.engine.begin() as connection:
+            rekap_warung, rekap_produk = rebuild_sales_rollup(connection)
+        click.echo(f'Rekap ditulis ulang: {len(rekap_warung)} baris warung, {len(rekap_produk)} baris produk.')
+
+    # Verifikasi isi tabel rekap terhadap data mentah
+    mismatches = 0
+    for model, expected, keys in (
+        (RekapHarianWarung, rekap_warung, ('warung_id', 'tanggal')),
+        (RekapHarianProduk, rekap_produk, ('warung_id', 'tanggal', 'produk_id')),
+    ):
+        stored = {}
+        for row in model.query.all():
+            values = {c.name: getattr(row, c.name) for c in model.__table__.columns if c.name not in keys}
+            if any(values.values()):
+                stored[tuple(getattr(row, key) for key in keys)] = values
+        for key in set(stored) | set(expected):
+            a, b = stored.get(key), expected.get(key)
+            if a is None or b is None or any(abs(a[name] - b[name]) > 0.01 for name in b):
+                mismatches += 1
+                click.echo(f'Tidak cocok {model.__tablename__} {key}: rekap={a} data={b}')
+
+    if mismatches:
+        raise SystemExit(f'{mismatches} baris rekap tidak cocok dengan data pesanan.')
+    click.echo('Rekap cocok dengan data pesanan.')
+
+@app.cli.command('prune-order-events')
+@click.option('--days', default=7, show_default=True, help='Simpan event outbox selama sekian hari.')
+def prune_order_events_command(days):
+    """
+    Menghapus event outbox pesanan yang lebih tua dari batas replay.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = db.session.execute(delete(OrderEvent).where(OrderEvent.created_at < cutoff))
+    db.session.commit()
+    click.echo(f'{result.rowcount} event dihapus.')
+
+@app.cli.command('prune-refresh-tokens')
+@click.option('--interval', default=0, show_default=True, help='Ulangi setiap sekian detik; 0 = sekali saja.')
+def prune_refresh_tokens_command(interval):
+    """
+    Menghapus refresh token yang sudah kedaluwarsa. Token yang dicabut disimpan sampai kedaluwarsa
+    agar pemakaian ulangnya tetap terdeteksi.
+    """
+    while True:
+        result = db.session.execute(delete(RefreshToken).where(RefreshToken.expires_at < datetime.utcnow()))
+        db.session.commit()
+        click.echo(f'{result.rowcount} refresh token dihapus.')
+        if not interval:
+            break
+        time.sleep(interval)
+
+@app.cli.command('gc-uploads')
+@click.option('--grace-hours', default=24, show_default=True,
+              help='Blob yang di-upload dalam sekian jam terakhir tidak dihapus walau belum dirujuk.')
+@click.option('--dry-run', is_flag=True, help='Hanya tampilkan blob yang akan dihapus.')
+def gc_uploads_command(grace_hours, dry_run):
+    """
+    Menghapus blob upload yang tidak dirujuk user/produk mana pun, beserta variannya.
+    """
+    # Ref yang pemiliknya sudah tidak ada dibuang lebih dulu
+    db.session.execute(delete(UploadRef).where(
+        UploadRef.jenis == 'avatar', ~exists().where(User.id == UploadRef.pemilik_id)
+    ))
+    db.session.execute(delete(UploadRef).where(
+        UploadRef.jenis == 'produk', ~exists().where(Produk.id == UploadRef.pemilik_id)
+    ))
+
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    is_orphan = (UploadBlob.uploaded_at < cutoff, ~exists().where(UploadRef.blob_hash == UploadBlob.hash))
+
+    if dry_run:
+        orphans = db.session.query(UploadBlob.path).filter(*is_orphan).all()
+        for (path,) in orphans:
+            click.echo(path)
+        db.session.rollback()
+        click.echo(f'{len(orphans)} blob akan dihapus.')
+        return
+
+    # Satu DELETE ... RETURNING: kondisi yatim dicek saat baris dihapus, jadi blob yang baru
+    # di-upload ulang atau dirujuk di antara SELECT dan DELETE tidak ikut terhapus.
+    # Hanya path yang benar-benar dihapus statement ini yang di-unlink.
+    orphans = db.session.execute(
+        delete(UploadBlob).where(*is_orphan).returning(UploadBlob.path, UploadBlob.ukuran)
+        .execution_options(synchronize_session=False)
+    ).all()
+    paths = []
+    for path, _ in orphans:
+        paths.append(path)
+        paths.extend(image_variant_filename(path, variant) for variant in app.config['IMAGE_VARIANTS'])
+    freed = sum(ukuran for _, ukuran in orphans)
+    # Baris dihapus lebih dulu agar database tidak pernah menunjuk file yang sudah hilang
+    db.session.commit()
+    for path in paths:
+        try:
+            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], path))
+        except FileNotFoundError:
+            pass
+    click.echo(f'{len(orphans)} blob dihapus ({freed} byte).')
+
+
+# Buat database jika belum ada; di akhir modul karena migrasi memakai helper yang didefinisikan di atas
+if app.config['AUTO_CREATE_TABLES']:
+    init_db()
+
+
 if __name__ == '__main__':
     socketio.run(app, debug=False, host='0.0.0.0', port=5001)
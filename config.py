@@ -1,7 +1,99 @@
 import os
+from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Muat variabel lingkungan dari .env sebelum nilai konfigurasi dibaca
+load_dotenv()
+
+
+def database_uri():
+    uri = os.getenv('DATABASE_URL', 'sqlite:///database.db')
+    # Heroku masih memberi skema postgres:// yang tidak dikenali SQLAlchemy
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+    if not uri.startswith('sqlite'):
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', '10'))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    return options
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    SQLALCHEMY_DATABASE_URI = database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Replica read-only untuk route publik bertanda @read_replica, mis. sqlite:///replica.db
+    # yang disegarkan berkala dengan `flask refresh-replica --interval 30`
+    SQLALCHEMY_BINDS = {'replica': os.getenv('REPLICA_DATABASE_URL')} if os.getenv('REPLICA_DATABASE_URL') else {}
+    # Perkiraan keterlambatan replica (detik); cache katalog yang baru diinvalidasi dibangun dari primary
+    REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', '60'))
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Buat tabel & jalankan migrasi otomatis saat aplikasi diimpor; matikan di produksi dan jalankan `flask init-db`
+    AUTO_CREATE_TABLES = os.getenv('AUTO_CREATE_TABLES', '1') == '1'
+    # Pragma SQLite: WAL agar pembaca tidak memblokir checkout, synchronous=NORMAL, busy timeout, mmap
+    SQLITE_TUNING = os.getenv('SQLITE_TUNING', '1') == '1'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+    UPLOAD_FOLDER = 'uploads'
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    # Varian gambar (ukuran sisi terpanjang, px) dibuat di background setelah upload; ?variant=thumb|medium
+    IMAGE_VARIANTS = {'thumb': 160, 'medium': 640}
+    IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP')
+    IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+    # Nama file upload unik (uuid/hash isi) sehingga boleh di-cache selamanya (Cache-Control: immutable)
+    UPLOADS_MAX_AGE = int(os.getenv('UPLOADS_MAX_AGE', str(365 * 24 * 3600)))
+    # Serahkan pengiriman byte /uploads ke proxy depan: '' (dikirim aplikasi), 'x-sendfile' (Apache/lighttpd)
+    # atau 'x-accel-redirect' (nginx, location internal UPLOADS_ACCEL_PREFIX yang menunjuk ke UPLOAD_FOLDER)
+    UPLOADS_OFFLOAD = os.getenv('UPLOADS_OFFLOAD', '')
+    UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '/internal-uploads/')
+    USE_X_SENDFILE = UPLOADS_OFFLOAD == 'x-sendfile'
+    # Cost factor bcrypt (dibaca Flask-Bcrypt); hash dihitung di thread OS, maksimal
+    # PASSWORD_HASH_MAX_PENDING sekaligus, selebihnya ditolak 503 alih-alih mengantre
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '4'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32'))
+    # Nilai nice thread hash (Linux): di mesin dengan sedikit core hub eventlet tetap kebagian CPU; 0 = tidak diubah
+    PASSWORD_HASH_NICE = int(os.getenv('PASSWORD_HASH_NICE', '10'))
+    # Masa berlaku access token (JWT) dan refresh token (disimpan sebagai hash, dirotasi tiap dipakai)
+    ACCESS_TOKEN_MINUTES = int(os.getenv('ACCESS_TOKEN_MINUTES', '30'))
+    REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', '30'))
+    # Mode token stateless: token_required memakai user_id dari JWT dan profil dari user_cache tanpa query
+    AUTH_STATELESS = os.getenv('AUTH_STATELESS', '1') == '1'
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '50'))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '200'))
+    # Cache respons katalog publik; isi RESPONSE_CACHE_URL (redis://...) untuk backend bersama antar worker
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '600'))
+    # Message queue Socket.IO agar broadcast room terbagi antar worker/host:
+    # redis://..., amqp://..., zmq+tcp://..., atau filesystem:///path/folder untuk uji lokal tanpa broker
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    # Alert pesanan dikirim dari background task; alert dalam satu jendela (detik) digabung per room
+    ORDER_ALERT_ASYNC = os.getenv('ORDER_ALERT_ASYNC', '1') == '1'
+    ORDER_ALERT_BATCH_WINDOW = float(os.getenv('ORDER_ALERT_BATCH_WINDOW', '0.05'))
+    ORDER_ALERT_BATCH_SIZE = int(os.getenv('ORDER_ALERT_BATCH_SIZE', '200'))
+    # /api/metrics/order-alerts (butuh login) hanya aktif bila diizinkan; mati secara default
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+    ORDER_EVENT_REPLAY_LIMIT = int(os.getenv('ORDER_EVENT_REPLAY_LIMIT', '500'))
+    # Perubahan stok/harga dalam jendela ini (detik) digabung sebelum dikirim ke room katalog; 0 = kirim langsung
+    CATALOG_DELTA_WINDOW = float(os.getenv('CATALOG_DELTA_WINDOW', '0.5'))
+    # Impor produk massal: batas ukuran body (byte), baris per executemany, dan batas delta per produk
+    # (impor yang lebih besar mengirim katalog_refresh agar client memuat ulang katalog)
+    PRODUK_IMPORT_MAX_BYTES = int(os.getenv('PRODUK_IMPORT_MAX_BYTES', str(256 * 1024 * 1024)))
+    PRODUK_IMPORT_BATCH_SIZE = int(os.getenv('PRODUK_IMPORT_BATCH_SIZE', '1000'))
+    PRODUK_IMPORT_DELTA_LIMIT = int(os.getenv('PRODUK_IMPORT_DELTA_LIMIT', '500'))
+    # Body impor ditampung dulu (di memori sampai batas ini, selebihnya file sementara) sebelum transaksi tulis dibuka
+    PRODUK_IMPORT_SPOOL_MEMORY = int(os.getenv('PRODUK_IMPORT_SPOOL_MEMORY', str(8 * 1024 * 1024)))
@@ -0,0 +1,109 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Aplikasi dikonfigurasi saat modul diimpor, jadi lingkungan uji disiapkan lebih dulu:
+# database dan folder uploads di direktori sementara, alert/delta dikirim langsung, bcrypt murah.
+WORKDIR = tempfile.mkdtemp(prefix='warung-tests-')
+os.chdir(WORKDIR)
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    'SECRET_KEY': 'kunci-rahasia-tes-yang-cukup-panjang-32b',
+    'ORDER_ALERT_ASYNC': '0',
+    'CATALOG_DELTA_WINDOW': '0',
+    'BCRYPT_LOG_ROUNDS': '4',
+})
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app = app_module.app
+    with flask_app.app_context():
+        app_module.db.drop_all()
+    app_module.init_db()
+    for cache in (app_module.user_cache, app_module.owned_warung_cache, app_module.response_cache.backend):
+        cache._data.clear()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """
+    Mendaftarkan pengguna lalu login; mengembalikan header Authorization.
+    """
+    def _login(username='alice'):
+        email = f'{username}@example.com'
+        client.post('/api/register', json={'username': username, 'email': email, 'password': 'rahasia'})
+        token = client.post('/api/login', json={'email': email, 'password': 'rahasia'}).json['token']
+        return {'Authorization': f'Bearer {token}'}
+    return _login
+
+
+@pytest.fixture
+def warung_with_produk(client, login):
+    """
+    Warung milik 'penjual' dengan satu produk; mengembalikan (headers_penjual, warung_id, produk_id).
+    """
+    def _create(stok=5, harga=10):
+        headers = login('penjual')
+        warung_id = client.post('/api/warung', headers=headers, json={'nama': 'Warung Uji', 'deskripsi': 'd'}).json['id']
+        produk_id = client.post('/api/produk', headers=headers, json={
+            'warung_id': warung_id, 'nama': 'Kopi', 'deskripsi': 'd', 'harga': harga, 'stok': stok
+        }).json['id']
+        return headers, warung_id, produk_id
+    return _create
+
+
+@pytest.fixture
+def server():
+    """
+    Menjalankan aplikasi sungguhan (eventlet, socketio.run) di proses terpisah; mengembalikan base URL.
+    env ditambahkan ke lingkungan proses, setup adalah kode yang dijalankan setelah app diimpor.
+    Server dijalankan berurutan, jadi hanya yang pertama membuat tabel di database baru.
+    """
+    processes = []
+
+    def _start(env, setup='', cwd=None):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        script = (
+            'import eventlet\neventlet.monkey_patch()\nfrom app import app, socketio\n'
+            # max_size: batas koneksi eventlet (bawaan 1024) dinaikkan untuk uji beban ribuan klien
+            f"{setup}\nsocketio.run(app, host='127.0.0.1', port={port}, log_output=False, max_size=20000)"
+        )
+        process = subprocess.Popen(
+            [sys.executable, '-W', 'ignore', '-c', script], cwd=cwd or WORKDIR,
+            env=dict(os.environ, PYTHONPATH=ROOT, **env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        processes.append(process)
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f'{url}/api/warung', timeout=1)
+                return url
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        raise RuntimeError(f'server di port {port} tidak mau jalan')
+
+    yield _start
+    for process in processes:
+        process.kill()
+        process.wait()
@@ -0,0 +1,83 @@
+import json
+import time
+
+from sqlalchemy import event
+
+from app import OrderEvent, db
+
+JUMLAH_REQUEST = 500
+
+
+def user_queries(app, send):
+    """
+    Menjalankan send() dan mengembalikan jumlah statement yang membaca tabel user.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM user' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert send().status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+def test_cached_user_skips_user_query_until_profile_update(app, client, login):
+    headers = login('alice')
+    client.get('/api/profile', headers=headers)
+
+    assert user_queries(app, lambda: client.get('/api/keranjang', headers=headers)) == 0
+    assert user_queries(app, lambda: client.get('/api/profile', headers=headers)) == 0
+
+    client.put('/api/profile', headers=headers, json={'username': 'alice2'})
+    assert user_queries(app, lambda: client.get('/api/profile', headers=headers)) == 1
+    assert user_queries(app, lambda: client.get('/api/profile', headers=headers)) == 0
+
+
+def test_profile_reflects_username_change_with_same_token(client, login):
+    headers = login('alice')
+
+    assert client.put('/api/profile', headers=headers, json={'username': 'alice2'}).status_code == 200
+
+    profile = client.get('/api/profile', headers=headers).json['user_data']
+    assert profile['username'] == 'alice2'
+
+
+def test_order_events_use_current_username(app, client, login, warung_with_produk):
+    _, warung_id, produk_id = warung_with_produk()
+    headers = login('alice')
+    client.put('/api/profile', headers=headers, json={'username': 'alice2'})
+
+    client.post('/api/keranjang/add', headers=headers, json={'produk_id': produk_id, 'jumlah': 1})
+    response = client.post('/api/keranjang/checkout', headers=headers, json={'shipping_address': 'Jl. Uji'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        payloads = [json.loads(event.payload) for event in OrderEvent.query.filter_by(warung_id=warung_id)]
+    assert [payload['pemesan'] for payload in payloads] == ['alice2']
+
+
+def test_requests_per_second_with_and_without_user_cache(app, client, login, monkeypatch, record_property):
+    headers = login('alice')
+    rps = {}
+    for stateless in (False, True):
+        monkeypatch.setitem(app.config, 'AUTH_STATELESS', stateless)
+        for path in ('/api/profile', '/api/keranjang'):
+            client.get(path, headers=headers)
+            start = time.perf_counter()
+            for _ in range(JUMLAH_REQUEST):
+                assert client.get(path, headers=headers).status_code == 200
+            rps[(stateless, path)] = JUMLAH_REQUEST / (time.perf_counter() - start)
+            mode = 'cache' if stateless else 'tanpa_cache'
+            record_property(f'rps_{mode}{path.replace("/", "_")}', round(rps[(stateless, path)]))
+            print(f'{mode:>11} {path}: {rps[(stateless, path)]:.0f} req/s')
+
+    # /api/keranjang tetap menjalankan query keranjang, jadi selisihnya kecil dan hanya dicatat;
+    # penghematan query-nya diuji deterministik di test_cached_user_skips_user_query_until_profile_update
+    assert rps[(True, '/api/profile')] > rps[(False, '/api/profile')]
@@ -0,0 +1,177 @@
+import threading
+import time
+
+from sqlalchemy import event, insert
+
+from app import DetailPesanan, Pesanan, Produk, db
+
+
+def run_concurrently(app, requests):
+    """
+    Menjalankan setiap fungsi request(client) di thread sendiri, dilepas bersamaan lewat barrier.
+    """
+    barrier = threading.Barrier(len(requests))
+    codes = []
+
+    def worker(send):
+        client = app.test_client()
+        barrier.wait()
+        codes.append(send(client).status_code)
+
+    threads = [threading.Thread(target=worker, args=(send,)) for send in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return codes
+
+
+def count_queries(app, send):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = send()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+
+def test_concurrent_checkout_never_oversells_last_units(app, client, login, warung_with_produk):
+    _, _, produk_id = warung_with_produk(stok=3, harga=10)
+    pembeli = [login(f'pembeli{i}') for i in range(20)]
+    for headers in pembeli:
+        client.post('/api/keranjang/add', headers=headers, json={'produk_id': produk_id, 'jumlah': 1})
+
+    codes = run_concurrently(app, [
+        lambda c, h=headers: c.post('/api/keranjang/checkout', headers=h, json={'shipping_address': 'Jl. Uji'})
+        for headers in pembeli
+    ])
+
+    assert codes.count(200) == 3
+    assert set(codes) == {200, 400}
+    with app.app_context():
+        assert db.session.get(Produk, produk_id).stok == 0
+        assert Pesanan.query.count() == 3
+        assert DetailPesanan.query.count() == 3
+
+
+def test_concurrent_local_checkout_never_oversells_last_units(app, login, warung_with_produk):
+    _, warung_id, produk_id = warung_with_produk(stok=3, harga=10)
+    payload = {
+        'warung_id': warung_id,
+        'alamat_pengiriman': 'Jl. Uji',
+        'total_harga': 10,
+        'items': [{'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 10}],
+    }
+    pembeli = [login(f'pembeli{i}') for i in range(20)]
+
+    codes = run_concurrently(app, [
+        lambda c, h=headers: c.post('/api/checkout/local', headers=h, json=payload)
+        for headers in pembeli
+    ])
+
+    assert codes.count(200) == 3
+    assert set(codes) == {200, 400}
+    with app.app_context():
+        assert db.session.get(Produk, produk_id).stok == 0
+        assert Pesanan.query.count() == 3
+
+
+def test_checkout_query_count_does_not_grow_with_cart_size(app, client, login):
+    penjual = login('penjual')
+    warung_id = client.post('/api/warung', headers=penjual, json={'nama': 'Warung Uji', 'deskripsi': 'd'}).json['id']
+    produk_ids = [client.post('/api/produk', headers=penjual, json={
+        'warung_id': warung_id, 'nama': f'Produk {i}', 'deskripsi': 'd', 'harga': 10, 'stok': 5
+    }).json['id'] for i in range(20)]
+
+    counts = []
+    for username, jumlah_produk in (('kecil', 2), ('besar', 20)):
+        headers = login(username)
+        for produk_id in produk_ids[:jumlah_produk]:
+            client.post('/api/keranjang/add', headers=headers, json={'produk_id': produk_id, 'jumlah': 1})
+        response, queries = count_queries(app, lambda: client.post(
+            '/api/keranjang/checkout', headers=headers, json={'shipping_address': 'Jl. Uji'}
+        ))
+        assert response.status_code == 200
+        counts.append(queries)
+
+    assert counts[0] == counts[1]
+
+
+def test_local_checkout_reports_every_bad_item(app, client, login, warung_with_produk):
+    _, warung_id, produk_id = warung_with_produk(stok=1, harga=10)
+    response = client.post('/api/checkout/local', headers=login('pembeli'), json={
+        'warung_id': warung_id,
+        'alamat_pengiriman': 'Jl. Uji',
+        'total_harga': 30,
+        'items': [
+            {'produk_id': produk_id, 'jumlah': 2, 'harga_satuan': 10},
+            {'produk_id': 9999, 'jumlah': 1, 'harga_satuan': 10},
+            {'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 12},
+        ],
+    })
+
+    assert response.status_code == 400
+    assert response.json['errors'] == [
+        'Produk dengan ID 9999 tidak ditemukan',
+        'Harga produk Kopi tidak sesuai',
+        'Stok produk Kopi tidak mencukupi. Stok tersedia: 1',
+    ]
+
+
+def test_local_checkout_rejects_non_positive_quantities(app, client, login, warung_with_produk):
+    _, warung_id, produk_id = warung_with_produk(stok=5, harga=10)
+    headers = login('pembeli')
+
+    for jumlah in (-10, 0.5, '2'):
+        response = client.post('/api/checkout/local', headers=headers, json={
+            'warung_id': warung_id,
+            'alamat_pengiriman': 'Jl. Uji',
+            'total_harga': -100,
+            'items': [{'produk_id': produk_id, 'jumlah': jumlah, 'harga_satuan': 10}],
+        })
+        assert response.status_code == 400
+        assert response.json['errors'] == [f'Jumlah produk dengan ID {produk_id} tidak valid']
+
+    with app.app_context():
+        assert db.session.get(Produk, produk_id).stok == 5
+        assert Pesanan.query.count() == 0
+
+
+def test_local_checkout_latency_by_item_count(app, client, login, record_property):
+    penjual = login('penjual')
+    warung_id = client.post('/api/warung', headers=penjual, json={'nama': 'Warung Uji', 'deskripsi': 'd'}).json['id']
+    with app.app_context():
+        db.session.execute(insert(Produk), [
+            {'warung_id': warung_id, 'nama': f'Produk {i}', 'deskripsi': 'd', 'harga': 10, 'stok': 100}
+            for i in range(200)
+        ])
+        db.session.commit()
+        produk_ids = [produk.id for produk in Produk.query.order_by(Produk.id)]
+
+    counts = {}
+    for jumlah_item in (1, 10, 50, 200):
+        headers = login(f'pembeli{jumlah_item}')
+        payload = {
+            'warung_id': warung_id,
+            'alamat_pengiriman': 'Jl. Uji',
+            'total_harga': 10 * jumlah_item,
+            'items': [{'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 10} for produk_id in produk_ids[:jumlah_item]],
+        }
+        start = time.perf_counter()
+        response, counts[jumlah_item] = count_queries(app, lambda: client.post(
+            '/api/checkout/local', headers=headers, json=payload
+        ))
+        latency_ms = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200
+        record_property(f'latency_ms_{jumlah_item}_item', round(latency_ms, 2))
+        print(f'checkout_local {jumlah_item:>3} item: {latency_ms:6.1f} ms, {counts[jumlah_item]} query')
+
+    # Satu query produk dan satu bulk insert detail: jumlah query tidak bergantung pada jumlah item
+    assert len(set(counts.values())) == 1
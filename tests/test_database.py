@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+from app import db
+
+# Beban campuran di proses terpisah (SQLITE_TUNING dibaca saat app diimpor): 4 thread membaca
+# katalog produk (cache respons dimatikan agar setiap baca menyentuh database) dan 4 thread
+# checkout 5 item, selama DURASI detik.
+MIXED_SCRIPT = r'''
+import json
+import threading
+import time
+from sqlalchemy import insert
+from app import app, db, init_db, Produk
+
+DURASI = 3.0
+init_db()
+client = app.test_client()
+
+def akun(nama):
+    email = f'{nama}@example.com'
+    client.post('/api/register', json={'username': nama, 'email': email, 'password': 'rahasia'})
+    token = client.post('/api/login', json={'email': email, 'password': 'rahasia'}).json['token']
+    return {'Authorization': f'Bearer {token}'}
+
+penjual = akun('penjual')
+warung_id = client.post('/api/warung', headers=penjual, json={'nama': 'Warung Uji', 'deskripsi': 'd'}).json['id']
+with app.app_context():
+    db.session.execute(insert(Produk), [
+        {'warung_id': warung_id, 'nama': f'Produk {i}', 'deskripsi': 'd', 'harga': 10, 'stok': 10 ** 6}
+        for i in range(50)
+    ])
+    db.session.commit()
+    produk_ids = [produk.id for produk in Produk.query]
+checkout = {
+    'warung_id': warung_id, 'alamat_pengiriman': 'Jl. Uji', 'total_harga': 50,
+    'items': [{'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 10} for produk_id in produk_ids[:5]],
+}
+
+latensi = {'baca': [], 'tulis': []}
+gagal = []
+stop = time.monotonic() + DURASI
+
+def worker(jenis, send):
+    c = app.test_client()
+    while time.monotonic() < stop:
+        start = time.perf_counter()
+        response = send(c)
+        if response.status_code == 200:
+            latensi[jenis].append(time.perf_counter() - start)
+        else:
+            gagal.append(response.status_code)
+
+threads = [
+    threading.Thread(target=worker, args=('baca', lambda c: c.get(f'/api/warung/{warung_id}/produk')))
+    for _ in range(4)
+] + [
+    threading.Thread(target=worker, args=('tulis', lambda c, h=akun(f'pembeli{i}'): c.post(
+        '/api/checkout/local', headers=h, json=checkout
+    )))
+    for i in range(4)
+]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+def p99_ms(values):
+    values = sorted(values)
+    return round(values[len(values) * 99 // 100] * 1000, 1)
+
+print(json.dumps({
+    'baca_per_detik': round(len(latensi['baca']) / DURASI),
+    'tulis_per_detik': round(len(latensi['tulis']) / DURASI),
+    'baca_p99_ms': p99_ms(latensi['baca']),
+    'tulis_p99_ms': p99_ms(latensi['tulis']),
+    'gagal': len(gagal),
+}))
+'''
+
+
+def pragma(name):
+    return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+
+def test_sqlite_connections_use_tuned_pragmas(app):
+    with app.app_context():
+        assert pragma('journal_mode') == 'wal'
+        # 1 = NORMAL
+        assert pragma('synchronous') == 1
+        assert pragma('busy_timeout') == app.config['SQLITE_BUSY_TIMEOUT_MS']
+        assert pragma('mmap_size') == app.config['SQLITE_MMAP_SIZE']
+
+
+def test_database_uri_comes_from_environment(app):
+    assert app.config['SQLALCHEMY_DATABASE_URI'].endswith('test.db')
+    with app.app_context():
+        assert db.engine.url.database.endswith('test.db')
+
+
+def run_mixed_load(tmp_path, tuning):
+    workdir = tmp_path / f'tuning-{tuning}'
+    workdir.mkdir()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        DATABASE_URL=f"sqlite:///{workdir / 'bench.db'}",
+        SQLITE_TUNING=tuning,
+        RESPONSE_CACHE_SIZE='0',
+    )
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c', MIXED_SCRIPT], cwd=workdir, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_mixed_catalog_reads_and_checkouts_default_vs_tuned(tmp_path, record_property):
+    hasil = {'default': run_mixed_load(tmp_path, '0'), 'tuned': run_mixed_load(tmp_path, '1')}
+    for mode, metrics in hasil.items():
+        for name, value in metrics.items():
+            record_property(f'{mode}_{name}', value)
+        print(f'{mode:>7}: {metrics}')
+
+    for metrics in hasil.values():
+        assert metrics['gagal'] == 0
+        assert metrics['baca_per_detik'] > 0 and metrics['tulis_per_detik'] > 0
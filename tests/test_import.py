@@ -0,0 +1,95 @@
+import io
+import json
+import sqlite3
+
+from app import Produk, db
+
+
+def import_produk(client, headers, warung_id, body, content_type='text/csv'):
+    return client.post(f'/api/warung/{warung_id}/produk/import',
+                       headers={**headers, 'Content-Type': content_type}, data=body)
+
+
+def test_csv_import_creates_and_updates_products(app, client, warung_with_produk):
+    headers, warung_id, produk_id = warung_with_produk(stok=5)
+    body = f'id,nama,harga,stok\n,Teh,5,10\n{produk_id},,,42\n,,1,1\n'
+
+    response = import_produk(client, headers, warung_id, body)
+
+    assert response.status_code == 200
+    assert (response.json['dibuat'], response.json['diperbarui'], response.json['gagal']) == (1, 1, 1)
+    assert [hasil['status'] for hasil in response.json['hasil']] == ['dibuat', 'diperbarui', 'gagal']
+    with app.app_context():
+        assert db.session.get(Produk, produk_id).stok == 42
+
+
+def test_csv_import_accepts_utf8_bom(app, client, warung_with_produk):
+    headers, warung_id, produk_id = warung_with_produk(stok=5)
+
+    response = import_produk(client, headers, warung_id, f'\ufeffid,stok\n{produk_id},42\n'.encode('utf-8'))
+
+    assert response.json['diperbarui'] == 1, response.json
+    with app.app_context():
+        assert db.session.get(Produk, produk_id).stok == 42
+
+
+def test_ndjson_import_rejects_products_of_other_warung(client, login, warung_with_produk):
+    _, _, produk_id = warung_with_produk()
+    headers = login('lain')
+    warung_id = client.post('/api/warung', headers=headers, json={'nama': 'Lain', 'deskripsi': 'd'}).json['id']
+    body = '\n'.join([json.dumps({'id': produk_id, 'stok': 1}), 'bukan json'])
+
+    response = import_produk(client, headers, warung_id, body, 'application/x-ndjson')
+
+    assert [hasil['error'] for hasil in response.json['hasil']] == [
+        'Produk tidak ditemukan di warung ini', 'Baris tidak valid'
+    ]
+
+
+def test_import_requires_owner_and_supported_content_type(client, login, warung_with_produk):
+    headers, warung_id, _ = warung_with_produk()
+    assert import_produk(client, login('lain'), warung_id, 'nama,harga,stok\n').status_code == 404
+    assert import_produk(client, headers, warung_id, '{}', 'application/json').status_code == 415
+
+
+class SlowUpload(io.BytesIO):
+    """
+    Body impor yang, selagi masih dibaca, mencoba menulis lewat koneksi SQLite lain,
+    seperti checkout yang datang saat klien impor masih mengunggah.
+    """
+    def __init__(self, body, database):
+        super().__init__(body)
+        self.database = database
+        self.locked = []
+
+    def readinto(self, buffer):
+        self.try_write()
+        return super().readinto(buffer)
+
+    def read(self, size=-1):
+        self.try_write()
+        return super().read(size)
+
+    def try_write(self):
+        if 0 < self.tell() < len(self.getbuffer()):
+            connection = sqlite3.connect(self.database, timeout=0.05)
+            try:
+                connection.execute("UPDATE warung SET deskripsi = 'checkout lain'")
+                connection.commit()
+            except sqlite3.OperationalError:
+                self.locked.append(self.tell())
+            finally:
+                connection.close()
+
+
+def test_import_does_not_hold_write_lock_while_body_is_uploading(app, client, warung_with_produk):
+    headers, warung_id, _ = warung_with_produk()
+    body = ('nama,harga,stok\n' + ''.join(f'Produk {i},10,5\n' for i in range(5000))).encode('utf-8')
+    with app.app_context():
+        upload = SlowUpload(body, db.engine.url.database)
+
+    response = client.post(f'/api/warung/{warung_id}/produk/import', input_stream=upload,
+                           content_length=len(body), headers={**headers, 'Content-Type': 'text/csv'})
+
+    assert response.json['dibuat'] == 5000
+    assert upload.locked == []
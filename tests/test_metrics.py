@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.fixture
+def metrics_enabled(app):
+    app.config['METRICS_ENABLED'] = True
+    yield
+    app.config['METRICS_ENABLED'] = False
+
+
+def test_order_alert_metrics_require_login(client, metrics_enabled):
+    assert client.get('/api/metrics/order-alerts').status_code == 401
+
+
+def test_order_alert_metrics_for_logged_in_user(client, login, metrics_enabled):
+    response = client.get('/api/metrics/order-alerts', headers=login())
+    assert response.status_code == 200
+    assert set(response.json) == {'terkirim', 'antrean', 'latency_p50_ms', 'latency_p99_ms'}
+
+
+def test_order_alert_metrics_disabled_by_default(client, login):
+    assert client.get('/api/metrics/order-alerts', headers=login()).status_code == 404
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+from app import password_hasher
+
+# Dijalankan di proses terpisah karena hub eventlet butuh monkey_patch sebelum app diimpor.
+# Semua koneksi Socket.IO dilayani hub yang sama, jadi keterlambatan greenlet penanda
+# di bawah adalah latensi yang dirasakan setiap klien Socket.IO selama login flood.
+FLOOD_SCRIPT = r'''
+import eventlet
+eventlet.monkey_patch()
+import json, time
+from app import app, init_db, password_hasher
+
+init_db()
+app.test_client().post('/api/register', json={'username': 'a', 'email': 'a@example.com', 'password': 'rahasia'})
+
+def login():
+    return app.test_client().post('/api/login', json={'email': 'a@example.com', 'password': 'rahasia'}).status_code
+
+def max_tick_delay_ms(jumlah_login):
+    delays, stop = [], []
+    def tick():
+        while not stop:
+            start = time.perf_counter()
+            eventlet.sleep(0.005)
+            delays.append(time.perf_counter() - start - 0.005)
+    ticker = eventlet.spawn(tick)
+    eventlet.sleep(0.05)
+    codes = list(eventlet.GreenPool(100).imap(lambda _: login(), range(jumlah_login)))
+    stop.append(True)
+    ticker.wait()
+    return max(delays) * 1000, codes
+
+flood_ms, codes = max_tick_delay_ms(20)
+run = password_hasher._run
+password_hasher._run = lambda fn, *args: fn(*args)
+inline_ms, _ = max_tick_delay_ms(1)
+password_hasher._run = run
+print(json.dumps({'flood_ms': flood_ms, 'inline_ms': inline_ms, 'codes': codes}))
+'''
+
+
+def test_login_flood_keeps_event_loop_latency_flat(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PYTHONPATH=root,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'flood.db'}",
+        BCRYPT_LOG_ROUNDS='12',
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', FLOOD_SCRIPT], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    hasil = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert hasil['codes'] == [200] * 20
+    # Satu hash inline menahan hub selama seluruh durasi bcrypt; 20 hash di pool tidak boleh
+    # menahannya lebih dari separuh waktu itu
+    assert hasil['flood_ms'] < hasil['inline_ms'] / 2, hasil
+
+
+def test_login_fails_fast_when_hash_queue_is_full(client, login, monkeypatch):
+    login('alice')
+    monkeypatch.setattr(password_hasher, 'max_pending', 0)
+
+    response = client.post('/api/login', json={'email': 'alice@example.com', 'password': 'rahasia'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
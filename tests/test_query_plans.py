@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import delete, func, inspect
+
+from app import Keranjang, Pesanan, Produk, RekapHarianWarung, SchemaMigration, db, init_db
+
+# Query panas aplikasi, disederhanakan ke bentuk yang sama dengan yang dijalankan handler-nya
+HOT_QUERIES = {
+    'view_cart': lambda: db.select(Keranjang.produk_id, Produk.nama, Keranjang.jumlah)
+        .join(Produk, Keranjang.produk_id == Produk.id).where(Keranjang.user_id == 1).order_by(Keranjang.id),
+    'add_to_cart_conflict_target': lambda: db.select(Keranjang.id)
+        .where(Keranjang.user_id == 1, Keranjang.produk_id == 1),
+    'get_warung_orders': lambda: db.select(Pesanan.id)
+        .where(Pesanan.warung_id == 1).order_by(Pesanan.tanggal.desc()),
+    'get_transaction_history': lambda: db.select(Pesanan.id).where(Pesanan.user_id == 1)
+        .order_by(Pesanan.tanggal.desc(), Pesanan.id.desc()).limit(50),
+    'get_wallet_summary': lambda: db.select(
+        func.sum(RekapHarianWarung.jumlah_selesai), func.sum(RekapHarianWarung.pendapatan_selesai)
+    ).where(RekapHarianWarung.warung_id.in_([1, 2])),
+}
+# Urutan keranjang satu pengguna (paling banyak puluhan baris) cukup disortir di memori;
+# indeks (user_id) terpisah hanya demi urutan id tidak sebanding dengan biaya tulisnya
+SORT_ALLOWED = {'view_cart'}
+
+
+def query_plan(stmt):
+    with db.engine.connect() as connection:
+        sql = str(stmt.compile(connection, compile_kwargs={'literal_binds': True}))
+        return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(app, name):
+    with app.app_context():
+        plan = query_plan(HOT_QUERIES[name]())
+
+    lookups = [step for step in plan if step.startswith(('SCAN', 'SEARCH'))]
+    assert lookups, plan
+    assert all('INDEX' in step or 'PRIMARY KEY' in step for step in lookups), plan
+    if name not in SORT_ALLOWED:
+        assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_migrations_leave_expected_pesanan_indexes(app):
+    with app.app_context():
+        indexes = {index['name']: index for index in inspect(db.engine).get_indexes('pesanan')}
+        keranjang = {index['name']: index for index in inspect(db.engine).get_indexes('keranjang')}
+
+    assert indexes['ix_pesanan_warung_tanggal']['column_names'] == ['warung_id', 'tanggal', 'id']
+    assert indexes['ix_pesanan_user_tanggal']['column_names'] == ['user_id', 'tanggal', 'id']
+    assert 'ix_pesanan_warung_status_total' not in indexes
+    assert keranjang['uq_keranjang_user_produk']['unique']
+    # Awalan indeks komposit; tidak dibuat lagi
+    assert not {'ix_pesanan_warung_id', 'ix_pesanan_user_id'} & set(indexes)
+    assert 'ix_keranjang_user_id' not in keranjang
+
+
+def test_migration_drops_unused_status_index_from_existing_databases(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                'CREATE INDEX ix_pesanan_warung_status_total ON pesanan (warung_id, status, total_harga)'
+            )
+            connection.execute(delete(SchemaMigration).where(SchemaMigration.versi == 3))
+
+    assert [versi for versi, _ in init_db()] == [3]
+    with app.app_context():
+        assert 'ix_pesanan_warung_status_total' not in {
+            index['name'] for index in inspect(db.engine).get_indexes('pesanan')
+        }
+
+
+def test_migration_drops_prefix_indexes_from_existing_databases(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('CREATE INDEX ix_keranjang_user_id ON keranjang (user_id)')
+            connection.exec_driver_sql('CREATE INDEX ix_pesanan_warung_id ON pesanan (warung_id)')
+            connection.exec_driver_sql('CREATE INDEX ix_pesanan_user_id ON pesanan (user_id)')
+            connection.execute(delete(SchemaMigration).where(SchemaMigration.versi == 4))
+
+    assert [versi for versi, _ in init_db()] == [4]
+    with app.app_context():
+        names = {index['name'] for table in ('keranjang', 'pesanan') for index in inspect(db.engine).get_indexes(table)}
+    assert not {'ix_keranjang_user_id', 'ix_pesanan_warung_id', 'ix_pesanan_user_id'} & names
@@ -0,0 +1,25 @@
+from app import cached_json_response, invalidate_catalog
+
+
+def test_body_built_before_invalidation_is_not_served_afterwards(app):
+    def build_stale():
+        # Checkout lain commit dan membuang cache selagi respons ini masih dibangun dari data lama
+        invalidate_catalog(1)
+        return {'stok': 5}, 200
+
+    with app.test_request_context('/api/warung/1/produk'):
+        assert cached_json_response('warung:1', 'produk', build_stale).json == {'stok': 5}
+        fresh = cached_json_response('warung:1', 'produk', lambda: ({'stok': 4}, 200))
+
+    assert fresh.json == {'stok': 4}
+
+
+def test_product_list_is_rebuilt_after_stock_change(client, login, warung_with_produk):
+    _, warung_id, produk_id = warung_with_produk(stok=5)
+    assert client.get(f'/api/warung/{warung_id}/produk').json[0]['stok'] == 5
+
+    pembeli = login('pembeli')
+    client.post('/api/keranjang/add', headers=pembeli, json={'produk_id': produk_id, 'jumlah': 2})
+    client.post('/api/keranjang/checkout', headers=pembeli, json={'shipping_address': 'Jl. Uji'})
+
+    assert client.get(f'/api/warung/{warung_id}/produk').json[0]['stok'] == 3
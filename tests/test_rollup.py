@@ -0,0 +1,85 @@
+import threading
+
+from sqlalchemy import delete, update
+
+from app import Pesanan, RekapHarianProduk, RekapHarianWarung, SchemaMigration, db, init_db
+
+
+def place_order(client, login, produk_id, jumlah=1, username='pembeli'):
+    headers = login(username)
+    client.post('/api/keranjang/add', headers=headers, json={'produk_id': produk_id, 'jumlah': jumlah})
+    assert client.post('/api/keranjang/checkout', headers=headers, json={'shipping_address': 'Jl. Uji'}).status_code == 200
+
+
+def test_status_rollup_counted_once_under_concurrent_updates(app, login, warung_with_produk):
+    penjual, _, produk_id = warung_with_produk(stok=5, harga=10)
+    place_order(app.test_client(), login, produk_id, jumlah=2)
+    with app.app_context():
+        pesanan_id = Pesanan.query.one().id
+
+    barrier = threading.Barrier(8)
+    codes = []
+
+    def selesaikan():
+        client = app.test_client()
+        barrier.wait()
+        response = client.put(f'/api/pesanan/{pesanan_id}/status', headers=penjual, json={'status': 'Selesai'})
+        codes.append(response.status_code)
+
+    threads = [threading.Thread(target=selesaikan) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert 200 in codes and set(codes) <= {200, 409}
+    summary = app.test_client().get('/api/wallet/summary', headers=penjual).json
+    assert summary == {'total_transaksi': 1, 'total_pendapatan': 20.0}
+
+
+def test_status_change_moves_order_in_and_out_of_selesai(app, client, login, warung_with_produk):
+    penjual, _, produk_id = warung_with_produk(stok=5, harga=10)
+    place_order(client, login, produk_id)
+    with app.app_context():
+        pesanan_id = Pesanan.query.one().id
+
+    client.put(f'/api/pesanan/{pesanan_id}/status', headers=penjual, json={'status': 'Selesai'})
+    assert client.get('/api/wallet/summary', headers=penjual).json['total_transaksi'] == 1
+
+    client.put(f'/api/pesanan/{pesanan_id}/status', headers=penjual, json={'status': 'Dibatalkan'})
+    assert client.get('/api/wallet/summary', headers=penjual).json == {'total_transaksi': 0, 'total_pendapatan': 0.0}
+
+
+def test_backfill_migration_fills_rollup_for_existing_orders(app, client, login, warung_with_produk):
+    penjual, _, produk_id = warung_with_produk(stok=5, harga=10)
+    place_order(client, login, produk_id, jumlah=3)
+
+    # Keadaan database sebelum rekap ada: pesanan tersimpan, tabel rekap kosong, migrasi 2 belum jalan
+    with app.app_context():
+        db.session.execute(delete(RekapHarianWarung))
+        db.session.execute(delete(RekapHarianProduk))
+        db.session.execute(delete(SchemaMigration).where(SchemaMigration.versi == 2))
+        db.session.commit()
+    assert client.get('/api/dashboard/warungs', headers=penjual).json['Warung Uji']['total_pendapatan'] == 0
+
+    assert [versi for versi, _ in init_db()] == [2]
+
+    dashboard = client.get('/api/dashboard/warungs', headers=penjual).json['Warung Uji']
+    assert dashboard['total_pendapatan'] == 30.0
+    assert dashboard['total_pesanan'] == 1
+    result = app.test_cli_runner().invoke(args=['rebuild-rollup', '--verify-only'])
+    assert result.exit_code == 0, result.output
+
+
+def test_rebuild_rollup_command_rewrites_tables(app, client, login, warung_with_produk):
+    _, _, produk_id = warung_with_produk(stok=5, harga=10)
+    place_order(client, login, produk_id, jumlah=2)
+    with app.app_context():
+        db.session.execute(update(RekapHarianWarung).values(pendapatan=999.0))
+        db.session.commit()
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['rebuild-rollup', '--verify-only']).exit_code != 0
+    result = runner.invoke(args=['rebuild-rollup'])
+    assert result.exit_code == 0, result.output
+    assert 'Rekap cocok dengan data pesanan.' in result.output
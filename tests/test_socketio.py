@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+import requests
+import socketio as python_socketio
+from sqlalchemy import event
+
+from app import db, socketio
+
+# Uji beban: naikkan FANOUT_SELLERS (mis. 2000) dan FANOUT_P99_MS; bawaan cukup kecil untuk CI.
+# Dengan ribuan klien di satu proses pytest, sisi klien sendiri ikut memperlambat penerimaan.
+JUMLAH_PENJUAL = int(os.getenv('FANOUT_SELLERS', '50'))
+BATAS_P99_MS = float(os.getenv('FANOUT_P99_MS', '1000'))
+JUMLAH_JOIN = 10_000
+
+
+def socket_client(app, headers=None, auth=None):
+    return socketio.test_client(app, headers=headers, auth=auth)
+
+
+def received(client, name):
+    return [event['args'][0] for event in client.get_received() if event['name'] == name]
+
+
+def test_malformed_authorization_header_is_refused(app):
+    for header in ('Bearer', 'Bearer ', 'Token abc def', 'Bearer not-a-jwt'):
+        client = socket_client(app, headers={'Authorization': header})
+        assert not client.is_connected()
+
+
+def test_anonymous_connection_cannot_join_warung_room(app):
+    client = socket_client(app)
+    assert client.is_connected()
+    client.emit('join', {'warung_id': 1})
+    assert received(client, 'join_error') == [{'warung_id': 1, 'message': 'Token is missing!'}]
+
+
+def test_owner_can_join_until_warung_is_deleted(app, client, warung_with_produk):
+    headers, warung_id, _ = warung_with_produk()
+    socket = socket_client(app, headers=headers)
+
+    socket.emit('join', {'warung_id': warung_id})
+    assert received(socket, 'joined_room') == [{'room': f'warung_{warung_id}'}]
+
+    assert client.delete(f'/api/warung/{warung_id}', headers=headers).status_code == 200
+    socket.emit('join', {'warung_id': warung_id})
+    assert received(socket, 'join_error') == [{'warung_id': warung_id, 'message': 'Unauthorized'}]
+
+
+def test_join_rejects_warung_of_another_user(app, login, warung_with_produk):
+    _, warung_id, _ = warung_with_produk()
+    socket = socket_client(app, headers=login('bukan_pemilik'))
+    socket.emit('join', {'warung_id': warung_id})
+    assert received(socket, 'join_error') == [{'warung_id': warung_id, 'message': 'Unauthorized'}]
+
+
+def test_join_replays_missed_order_events(app, client, login, warung_with_produk):
+    headers, warung_id, produk_id = warung_with_produk()
+    pembeli = login('pembeli')
+    for _ in range(2):
+        client.post('/api/keranjang/add', headers=pembeli, json={'produk_id': produk_id, 'jumlah': 1})
+        client.post('/api/keranjang/checkout', headers=pembeli, json={'shipping_address': 'Jl. Uji'})
+
+    socket = socket_client(app, headers=headers)
+    socket.emit('join', {'warung_id': warung_id, 'last_event_id': '1'})
+    replay = received(socket, 'order_events_replay')
+    assert [event['event_id'] for event in replay[0]['events']] == [2]
+    assert replay[0]['lengkap'] is True
+
+
+def test_join_rejects_invalid_last_event_id(app, warung_with_produk):
+    headers, warung_id, _ = warung_with_produk()
+    socket = socket_client(app, headers=headers)
+    socket.emit('join', {'warung_id': warung_id, 'last_event_id': 'abc'})
+    events = socket.get_received()
+    assert [event['args'][0] for event in events if event['name'] == 'join_error'] == [
+        {'warung_id': warung_id, 'message': 'last_event_id tidak valid'}
+    ]
+    assert not [event for event in events if event['name'] == 'joined_room']
+
+
+def test_reconnect_storm_joins_answer_from_cache(app, warung_with_produk, record_property):
+    headers, warung_id, _ = warung_with_produk()
+    socket_client(app, headers=headers).disconnect()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    latencies = []
+    try:
+        # 100 klien tersambung ulang, masing-masing join 100 kali: 10k join
+        for _ in range(JUMLAH_JOIN // 100):
+            socket = socket_client(app, headers=headers)
+            for _ in range(100):
+                start = time.perf_counter()
+                socket.emit('join', {'warung_id': warung_id})
+                latencies.append(time.perf_counter() - start)
+            assert len(received(socket, 'joined_room')) == 100
+            socket.disconnect()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2] * 1000, latencies[len(latencies) * 99 // 100] * 1000
+    record_property('join_latency_p50_ms', round(p50, 3))
+    record_property('join_latency_p99_ms', round(p99, 3))
+    print(f'{JUMLAH_JOIN} join: p50 {p50:.3f} ms, p99 {p99:.3f} ms')
+    assert statements == []
+    assert p99 < 5
+
+
+def test_order_alert_reaches_sellers_on_another_worker(tmp_path, server, record_property):
+    # Dua proses server berbagi antrean filesystem://; penjual terhubung ke worker A, checkout lewat worker B
+    env = {
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'fanout.db'}",
+        'SOCKETIO_MESSAGE_QUEUE': f"filesystem://{tmp_path / 'queue'}",
+    }
+    worker_a, api = server(env, cwd=tmp_path), server(env, cwd=tmp_path)
+    clients = []
+    try:
+        requests.post(f'{api}/api/register', json={'username': 'penjual', 'email': 'penjual@example.com', 'password': 'rahasia'})
+        token = requests.post(f'{api}/api/login', json={'email': 'penjual@example.com', 'password': 'rahasia'}).json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        warung_id = requests.post(f'{api}/api/warung', headers=headers, json={'nama': 'Warung Uji', 'deskripsi': 'd'}).json()['id']
+        produk_id = requests.post(f'{api}/api/produk', headers=headers, json={
+            'warung_id': warung_id, 'nama': 'Kopi', 'deskripsi': 'd', 'harga': 10, 'stok': 5
+        }).json()['id']
+
+        alerts = []
+        for _ in range(JUMLAH_PENJUAL):
+            joined, client = threading.Event(), python_socketio.Client()
+            client.on('joined_room', lambda data, joined=joined: joined.set())
+            client.on('new_order_alert', lambda data: alerts.append((time.monotonic(), data)))
+            client.connect(worker_a, headers=headers, transports=['websocket'])
+            client.emit('join', {'warung_id': warung_id})
+            assert joined.wait(10)
+            clients.append(client)
+
+        start = time.monotonic()
+        response = requests.post(f'{api}/api/checkout/local', headers=headers, json={
+            'warung_id': warung_id, 'alamat_pengiriman': 'Jl. Uji', 'total_harga': 10,
+            'items': [{'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 10}],
+        })
+        assert response.status_code == 200
+        deadline = time.monotonic() + 30
+        while len(alerts) < JUMLAH_PENJUAL and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert len(alerts) == JUMLAH_PENJUAL
+        assert {data['pesanan_id'] for _, data in alerts} == {response.json()['pesanan_id']}
+        # Latensi pengiriman per penjual, dihitung dari saat checkout dikirim ke worker B
+        latencies = sorted((received_at - start) * 1000 for received_at, _ in alerts)
+        p50, p99 = latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100]
+        record_property('alert_latency_p50_ms', round(p50, 1))
+        record_property('alert_latency_p99_ms', round(p99, 1))
+        print(f'{JUMLAH_PENJUAL} penjual: p50 {p50:.1f} ms, p99 {p99:.1f} ms')
+        assert p99 < BATAS_P99_MS
+    finally:
+        for client in clients:
+            client.disconnect()
@@ -0,0 +1,60 @@
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import DetailPesanan, Pesanan, User, db
+
+JUMLAH_PESANAN = 100_000
+# Batas puncak alokasi selama streaming; respons lengkapnya sendiri lebih dari 20 MB
+BATAS_MEMORI = 8 * 1024 * 1024
+
+
+def seed_pesanan(app, user_id, warung_id, produk_id, jumlah):
+    tanggal = datetime(2026, 1, 1)
+    with app.app_context():
+        db.session.execute(insert(Pesanan), [{
+            'id': i, 'user_id': user_id, 'warung_id': warung_id, 'alamat_pengiriman': 'Jl. Uji',
+            'total_harga': 10, 'status': 'Selesai', 'tanggal': tanggal + timedelta(seconds=i)
+        } for i in range(1, jumlah + 1)])
+        db.session.execute(insert(DetailPesanan), [
+            {'pesanan_id': i, 'produk_id': produk_id, 'jumlah': 1, 'harga_satuan': 10}
+            for i in range(1, jumlah + 1)
+        ])
+        db.session.commit()
+
+
+def stream_with_peak(client, url, headers):
+    """
+    Membaca respons NDJSON potong demi potong; mengembalikan (baris pertama, jumlah baris, byte, puncak memori).
+    """
+    tracemalloc.start()
+    try:
+        response = client.get(url, headers=headers, buffered=False)
+        assert response.mimetype == 'application/x-ndjson'
+        first, lines, size = None, 0, 0
+        for chunk in response.response:
+            if first is None:
+                first = json.loads(chunk)
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+        response.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return first, lines, size, peak
+
+
+def test_streaming_exports_keep_memory_bounded(app, client, warung_with_produk):
+    penjual, warung_id, produk_id = warung_with_produk()
+    with app.app_context():
+        user_id = User.query.filter_by(username='penjual').one().id
+    seed_pesanan(app, user_id, warung_id, produk_id, JUMLAH_PESANAN)
+
+    for url in (f'/api/warung/{warung_id}/pesanan?stream=1', '/api/transaksi?stream=1'):
+        first, lines, size, peak = stream_with_peak(client, url, penjual)
+        assert first['pesanan_id'] == JUMLAH_PESANAN
+        assert lines == JUMLAH_PESANAN
+        assert size > 20 * 1024 * 1024
+        assert peak < BATAS_MEMORI, f'{url}: puncak memori {peak} byte'
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from app import UploadBlob, UploadRef, User, db
+
+BLOB = 'ab/cd/abcd1234.png'
+ISI = b'0123456789' * 10
+
+
+@pytest.fixture
+def upload(app, tmp_path, monkeypatch):
+    # Path absolut: send_from_directory membaca path relatif terhadap root aplikasi, bukan cwd
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    path = tmp_path / BLOB
+    path.parent.mkdir(parents=True)
+    path.write_bytes(ISI)
+    return f'/uploads/{BLOB}'
+
+
+def test_upload_has_strong_etag_and_immutable_cache(client, upload):
+    response = client.get(upload)
+
+    assert response.status_code == 200
+    assert response.data == ISI
+    assert response.headers['ETag'] == '"abcd1234"'
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+    assert response.cache_control.max_age == client.application.config['UPLOADS_MAX_AGE']
+
+
+def test_upload_honors_if_none_match_and_range(client, upload):
+    assert client.get(upload, headers={'If-None-Match': '"abcd1234"'}).status_code == 304
+
+    response = client.get(upload, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == ISI[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(ISI)}'
+
+
+def test_missing_variant_falls_back_to_original_without_immutable(client, upload):
+    response = client.get(f'{upload}?variant=thumb')
+
+    assert response.status_code == 200
+    assert response.data == ISI
+    assert not response.cache_control.immutable
+    assert response.cache_control.no_cache
+
+
+def test_x_accel_redirect_leaves_bytes_to_the_proxy(app, client, upload, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOADS_OFFLOAD', 'x-accel-redirect')
+
+    response = client.get(upload)
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/internal-uploads/{BLOB}'
+    assert response.headers['ETag'] == '"abcd1234"'
+    assert response.cache_control.immutable
+
+    assert client.get(upload, headers={'If-None-Match': '"abcd1234"'}).status_code == 304
+    assert client.get('/uploads/ab/cd/tidak-ada.png').status_code == 404
+
+
+GAMBAR_BESAR = 'ef/01/ef01beef.jpg'
+DURASI = 2.0
+
+
+def load_uploads(base_url, headers, durasi=DURASI):
+    """
+    4 thread mengunduh gambar berulang-ulang sementara satu thread mengukur latensi endpoint JSON
+    ringan di worker yang sama; latensi itu menunjukkan berapa lama worker tertahan oleh byte gambar.
+    """
+    stop = time.monotonic() + durasi
+    unduhan, ping, statuses = [], [], set()
+
+    def unduh():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            response = session.get(f'{base_url}/uploads/{GAMBAR_BESAR}', headers=headers)
+            statuses.add(response.status_code)
+            unduhan.append(len(response.content))
+
+    def ukur_ping():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            session.get(f'{base_url}/api/warung')
+            ping.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=unduh) for _ in range(4)] + [threading.Thread(target=ukur_ping)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ping.sort()
+    return {
+        'status': sorted(statuses),
+        'gambar_per_detik': round(len(unduhan) / durasi),
+        'mb_per_detik': round(sum(unduhan) / durasi / 1024 / 1024, 1),
+        'ping_p50_ms': round(ping[len(ping) // 2] * 1000, 1),
+        'ping_p99_ms': round(ping[len(ping) * 99 // 100] * 1000, 1),
+    }
+
+
+def test_image_throughput_and_worker_blocking(tmp_path, server, record_property):
+    folder = tmp_path / 'uploads'
+    (folder / GAMBAR_BESAR).parent.mkdir(parents=True)
+    (folder / GAMBAR_BESAR).write_bytes(os.urandom(1024 * 1024))
+    setup = f'app.config["UPLOAD_FOLDER"] = {str(folder)!r}'
+    database = {'DATABASE_URL': f"sqlite:///{tmp_path / 'uploads.db'}"}
+    aplikasi = server(database, setup, cwd=tmp_path)
+    offload = server(dict(database, UPLOADS_OFFLOAD='x-accel-redirect'), setup, cwd=tmp_path)
+
+    hasil = {
+        # Setiap request mengirim 1 MB dari worker, seperti sebelum ada header cache
+        'kirim': load_uploads(aplikasi, {}),
+        # Klien yang menyimpan ETag hanya merevalidasi; worker menjawab 304 tanpa body
+        'revalidasi': load_uploads(aplikasi, {'If-None-Match': '"ef01beef"'}),
+        # Proxy depan yang mengirim byte; worker hanya mengisi header X-Accel-Redirect
+        'x-accel-redirect': load_uploads(offload, {}),
+    }
+    for mode, metrics in hasil.items():
+        for name, value in metrics.items():
+            if name != 'status':
+                record_property(f'{mode}_{name}', value)
+        print(f'{mode:>16}: {metrics}')
+
+    assert hasil['kirim']['status'] == [200] and hasil['kirim']['mb_per_detik'] > 0
+    assert hasil['revalidasi']['status'] == [304] and hasil['revalidasi']['mb_per_detik'] == 0
+    assert hasil['x-accel-redirect']['status'] == [200] and hasil['x-accel-redirect']['mb_per_detik'] == 0
+
+
+def test_gc_uploads_removes_only_unreferenced_old_blobs(app, login, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    login('alice')
+    lama = datetime.utcnow() - timedelta(days=2)
+    with app.app_context():
+        user_id = User.query.filter_by(username='alice').one().id
+        for hash_, uploaded_at in (('yatim', lama), ('dipakai', lama), ('baru', datetime.utcnow())):
+            db.session.add(UploadBlob(hash=hash_, path=f'aa/bb/{hash_}.png', ukuran=len(ISI), uploaded_at=uploaded_at))
+        db.session.add(UploadRef(jenis='avatar', pemilik_id=user_id, blob_hash='dipakai'))
+        db.session.commit()
+    for name in ('yatim.png', 'yatim_thumb.webp', 'dipakai.png', 'baru.png'):
+        (tmp_path / 'aa' / 'bb').mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'aa' / 'bb' / name).write_bytes(ISI)
+
+    dry_run = app.test_cli_runner().invoke(args=['gc-uploads', '--dry-run'])
+    assert dry_run.output.splitlines() == ['aa/bb/yatim.png', '1 blob akan dihapus.']
+    assert (tmp_path / 'aa' / 'bb' / 'yatim.png').exists()
+
+    result = app.test_cli_runner().invoke(args=['gc-uploads'])
+    assert result.output.strip() == f'1 blob dihapus ({len(ISI)} byte).'
+    assert sorted(path.name for path in (tmp_path / 'aa' / 'bb').iterdir()) == ['baru.png', 'dipakai.png']
+    with app.app_context():
+        assert sorted(blob.hash for blob in UploadBlob.query) == ['baru', 'dipakai']